@@ -0,0 +1,123 @@
+"""
+Admin API: on-demand profiling and persistence of the live process
+"""
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse
+from typing import Optional
+import asyncio
+import functools
+
+from models.device import Device
+from models.protocols import DHCPLease
+from models.scenarios import RunningScenario
+from models.detection import SecurityAlert
+from tools.profiler import count_objects
+
+router = APIRouter()
+
+@router.post("/profile/start")
+async def start_cpu_profile(request: Request, seconds: float = 10.0, interval_ms: float = 5.0):
+    """Start a sampling CPU profile for N seconds"""
+    if not 0 < seconds <= 300:
+        raise HTTPException(status_code=400, detail="seconds must be in (0, 300]")
+    if not 1 <= interval_ms <= 1000:
+        raise HTTPException(status_code=400, detail="interval_ms must be in [1, 1000]")
+    profiler = request.app.state.cpu_profiler
+    try:
+        profile_id = profiler.start(seconds, interval_ms / 1000)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    return {"success": True, "profile_id": profile_id, "seconds": seconds}
+
+@router.post("/profile/stop")
+async def stop_cpu_profile(request: Request):
+    """Stop the running CPU profile early"""
+    profiler = request.app.state.cpu_profiler
+    output = profiler.stop()
+    return {"success": output is not None, **profiler.status()}
+
+@router.get("/profile/status")
+async def get_cpu_profile_status(request: Request):
+    """Get CPU profiler status"""
+    return request.app.state.cpu_profiler.status()
+
+@router.get("/profile/{profile_id}")
+async def download_cpu_profile(profile_id: str, request: Request):
+    """Download a collapsed-stack file (input for flamegraph.pl or speedscope)"""
+    path = request.app.state.cpu_profiler.output_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=path.name)
+
+@router.post("/memory/snapshot")
+async def take_memory_snapshot(request: Request):
+    """Capture a tracemalloc snapshot (starts tracing on first call)
+
+    Snapshots walk every traced allocation, so they run off the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, request.app.state.memory_profiler.snapshot)
+
+@router.get("/memory/snapshots")
+async def list_memory_snapshots(request: Request):
+    """List stored snapshots"""
+    profiler = request.app.state.memory_profiler
+    return {"tracing": profiler.tracing, "snapshots": profiler.list()}
+
+@router.get("/memory/diff")
+async def diff_memory_snapshots(request: Request, first: str, second: str,
+                                limit: int = 20, key_type: str = "lineno"):
+    """Diff two snapshots, largest growth first"""
+    if key_type not in ("lineno", "filename", "traceback"):
+        raise HTTPException(status_code=400, detail="key_type must be lineno, filename or traceback")
+    diff = functools.partial(request.app.state.memory_profiler.diff, first, second,
+                             limit=limit, key_type=key_type)
+    stats = await asyncio.get_running_loop().run_in_executor(None, diff)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    return {"first": first, "second": second, "stats": stats}
+
+@router.post("/memory/stop")
+async def stop_memory_tracing(request: Request):
+    """Stop tracemalloc and drop snapshots"""
+    request.app.state.memory_profiler.stop()
+    return {"success": True, "tracing": False}
+
+@router.get("/persistence")
+async def get_persistence_stats(request: Request):
+    """Write-behind persistence statistics"""
+    persistence = getattr(request.app.state, "persistence", None)
+    if persistence is None:
+        raise HTTPException(status_code=503, detail="Persistence not started")
+    return persistence.stats()
+
+@router.post("/persistence/flush")
+async def flush_persistence(request: Request):
+    """Write pending changes now instead of waiting for the next interval"""
+    persistence = getattr(request.app.state, "persistence", None)
+    if persistence is None:
+        raise HTTPException(status_code=503, detail="Persistence not started")
+    written = await persistence.flush_async()
+    return {"success": True, "rows_written": written, **persistence.stats()}
+
+@router.get("/objects")
+async def get_object_counts(request: Request):
+    """Live object counts per model type and log sizes"""
+    state = request.app.state
+    # gc.get_objects() walks the whole heap; keep it off the event loop
+    objects = await asyncio.get_running_loop().run_in_executor(
+        None, count_objects, [Device, DHCPLease, RunningScenario, SecurityAlert]
+    )
+    return {
+        "objects": objects,
+        "logs": {
+            "omci_logs": len(state.protocol_simulator.omci_logs),
+            "dhcp_leases": len(state.protocol_simulator.dhcp_leases),
+            "arp": state.protocol_simulator.arp.stats(),
+            "alerts": len(state.detection_engine.alerts),
+            "scenario_results": sum(
+                len(run.results) for run in state.scenario_runner.get_runs()
+            )
+        },
+        "telemetry": state.telemetry_store.stats()
+    }
@@ -1,9 +1,13 @@
 """
 Device management API
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
 from typing import List, Optional
 from pydantic import BaseModel
+import time
+
+from api.responses import cached_json, decode_cursor, encode_cursor, parse_fields, project
+from models.device import DEVICE_FIELDS
 
 router = APIRouter()
 
@@ -19,22 +23,36 @@ class DeviceUpdateRequest(BaseModel):
     config: dict
 
 @router.get("/")
-async def list_devices(device_type: Optional[str] = None):
-    """List all devices"""
-    # Mock implementation
-    return {
-        "devices": [],
-        "total": 0
-    }
+async def list_devices(request: Request, device_type: Optional[str] = None,
+                       parent: Optional[str] = None, fields: Optional[str] = None,
+                       cursor: Optional[str] = None, limit: int = Query(100, ge=1, le=1000)):
+    """List devices with cursor pagination, type/parent filters and field projection"""
+    manager = request.app.state.device_manager
+    after = decode_cursor(cursor)
+    selected = parse_fields(fields, DEVICE_FIELDS)
+
+    def build():
+        devices, next_seq, total = manager.page_devices(
+            after_seq=after, limit=limit, device_type=device_type, parent=parent
+        )
+        return {
+            "devices": [project(device, selected) for device in devices],
+            "total": total,
+            "next_cursor": encode_cursor(next_seq),
+            "version": manager.version
+        }
+
+    return cached_json(request, manager.version, build)
 
 @router.get("/{device_id}")
-async def get_device(device_id: str):
+async def get_device(device_id: str, request: Request, fields: Optional[str] = None):
     """Get device details"""
-    return {
-        "id": device_id,
-        "type": "unknown",
-        "status": "offline"
-    }
+    device = request.app.state.device_manager.get_device(device_id)
+    if not device:
+        raise HTTPException(status_code=404, detail="Device not found")
+    selected = parse_fields(fields, DEVICE_FIELDS)
+    return cached_json(request, request.app.state.device_manager.version,
+                       lambda: project(device, selected))
 
 @router.post("/")
 async def create_device(request: DeviceCreateRequest):
@@ -63,6 +81,83 @@ async def get_device_logs(device_id: str, limit: int = 100):
     """Get device logs"""
     return {"logs": [], "device_id": device_id}
 
+@router.get("/{device_id}/mib")
+async def get_device_mib(device_id: str, request: Request):
+    """Get OMCI MIB of an ONT as seen by the ONT and by the OLT"""
+    device = request.app.state.device_manager.get_device(device_id)
+    if not device or device.type != "ONT":
+        raise HTTPException(status_code=404, detail="ONT not found")
+    mib, olt_copy = request.app.state.protocol_simulator.omci_mib.ensure(device)
+    return {
+        "ont": mib.to_dict(),
+        "olt_mib_data_sync": olt_copy.mib_data_sync
+    }
+
+@router.get("/{device_id}/arp")
+async def get_device_arp(device_id: str, request: Request):
+    """Get the ARP cache of a device"""
+    simulator = request.app.state.protocol_simulator
+    if device_id != simulator.gateway_id and not request.app.state.device_manager.get_device(device_id):
+        raise HTTPException(status_code=404, detail="Device not found")
+    cache = simulator.arp.caches.get(device_id)
+    entries = cache.entries(time.time()) if cache else {}
+    return {"device_id": device_id, "entries": entries, "total": len(entries)}
+
+@router.post("/{device_id}/reboot")
+async def reboot_device(device_id: str, request: Request, power: bool = False,
+                        fast_forward: bool = False):
+    """Reboot an OLT or ONT; the ONTs re-register through the activation engine
+
+    power=true models a site power loss (ONTs boot from scratch too);
+    fast_forward=true runs the recovery to completion in simulated time.
+    """
+    device = request.app.state.device_manager.get_device(device_id)
+    if not device:
+        raise HTTPException(status_code=404, detail="Device not found")
+    activation = request.app.state.protocol_simulator.activation
+    if device.type == "OLT":
+        report = activation.power_event(device_id) if power else activation.reboot_olt(device_id)
+    elif device.type == "ONT":
+        report = activation.reboot_ont(device)
+    else:
+        raise HTTPException(status_code=400, detail="Only OLTs and ONTs can be rebooted")
+    if fast_forward:
+        await activation.run_until_idle_async()
+    return {"success": True, "report": report}
+
+def _get_ont(request: Request, device_id: str):
+    device = request.app.state.device_manager.get_device(device_id)
+    if not device:
+        raise HTTPException(status_code=404, detail="Device not found")
+    if device.type != "ONT":
+        raise HTTPException(status_code=400, detail="Only ONTs can be authorized")
+    return device
+
+@router.post("/{device_id}/authorize")
+async def authorize_ont(device_id: str, request: Request):
+    """Add the ONT's serial to the OLT's allowed-serial table for its PON port
+
+    A rejected ONT with this serial rejoins discovery right away.
+    """
+    ont = _get_ont(request, device_id)
+    request.app.state.protocol_simulator.activation.authorize(ont.serial_number, ont.olt_id, ont.pon_port)
+    return {"success": True, "serial_number": ont.serial_number, "authorized": True}
+
+@router.post("/{device_id}/revoke")
+async def revoke_ont(device_id: str, request: Request):
+    """Remove the ONT's serial from the allowed-serial table"""
+    ont = _get_ont(request, device_id)
+    request.app.state.protocol_simulator.activation.revoke(ont.serial_number)
+    return {"success": True, "serial_number": ont.serial_number, "authorized": False}
+
+@router.get("/{device_id}/activation")
+async def get_device_activation(device_id: str, request: Request):
+    """Get ONT activation state (O1-O5), ONU-ID and equalization delay"""
+    state = request.app.state.protocol_simulator.activation.get_state(device_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="No activation state for device")
+    return state
+
 @router.post("/{device_id}/ssh")
 async def device_ssh_command(device_id: str, command: str):
     """Execute SSH command on device"""
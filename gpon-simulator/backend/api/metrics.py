@@ -1,8 +1,10 @@
 """
 Metrics and monitoring API
 """
-from fastapi import APIRouter
-from typing import Dict, List
+from fastapi import APIRouter, HTTPException, Request
+from typing import Dict, List, Optional
+
+from models.telemetry import METRICS, AGGREGATIONS
 
 router = APIRouter()
 
@@ -35,13 +37,62 @@ async def get_dhcp_stats():
     }
 
 @router.get("/omci")
-async def get_omci_logs(limit: int = 100):
+async def get_omci_logs(request: Request, limit: int = 100, ont_id: Optional[str] = None):
     """Get OMCI logs"""
+    simulator = request.app.state.protocol_simulator
+    return {
+        "logs": simulator.get_omci_logs(ont_id=ont_id, limit=limit),
+        "total": len(simulator.omci_logs)
+    }
+
+@router.post("/omci/audit")
+async def audit_omci(request: Request, repair: bool = False):
+    """Audit ONT MIBs against the OLT copy, uploading only divergent ME classes
+
+    Only ONTs with a MIB (provisioned by activation or touched by OMCI) are
+    audited; ONTs OMCI never reached have nothing to diverge from.
+    """
+    return await request.app.state.protocol_simulator.audit_omci_mibs(repair=repair)
+
+@router.get("/arp")
+async def get_arp_stats(request: Request, window: float = 60.0, limit: int = 100):
+    """Get ARP journal statistics, recent ownership changes and contested IPs"""
+    arp = request.app.state.protocol_simulator.arp
     return {
-        "logs": [],
-        "total": 0
+        **arp.stats(),
+        "recent_changes": list(arp.journal.recent)[-limit:],
+        "conflicts": arp.journal.conflicts(window_s=window, limit=limit)
     }
 
+@router.get("/arp/{ip_address}")
+async def get_arp_ip(ip_address: str, request: Request, window: float = 60.0):
+    """Who has claimed an IP within the window, and its change history"""
+    journal = request.app.state.protocol_simulator.arp.journal
+    return {
+        "ip": ip_address,
+        "owner": journal.owner(ip_address),
+        "in_conflict": journal.in_conflict(ip_address, window),
+        "claimants": journal.claimants(ip_address, window),
+        "history": journal.history(ip_address)
+    }
+
+@router.get("/activation")
+async def get_activation_stats(request: Request, limit: int = 20):
+    """Get ONT activation engine statistics and recent recovery reports"""
+    activation = request.app.state.protocol_simulator.activation
+    return {
+        **activation.stats(),
+        "reports": list(activation.reports.values())[-limit:]
+    }
+
+@router.get("/activation/{report_id}")
+async def get_activation_report(report_id: str, request: Request):
+    """Get one recovery report (time to full service, collisions, rejects)"""
+    report = request.app.state.protocol_simulator.activation.get_report(report_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    return report
+
 @router.get("/traffic")
 async def get_traffic_stats():
     """Get traffic statistics"""
@@ -52,24 +103,47 @@ async def get_traffic_stats():
         "bytes_total": 0
     }
 
-@router.get("/devices/{device_id}")
-async def get_device_metrics(device_id: str):
-    """Get metrics for specific device"""
+@router.get("/devices/top")
+async def get_top_devices(request: Request, metric: str = "cpu_usage", k: int = 10,
+                          agg: str = "latest", window: Optional[int] = None):
+    """Get top-K devices by metric"""
+    if metric not in METRICS:
+        raise HTTPException(status_code=400, detail=f"Unknown metric {metric}")
+    if agg not in AGGREGATIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown aggregation {agg}")
+    top = request.app.state.telemetry_store.top_k(metric, k=k, agg=agg, window=window)
     return {
-        "device_id": device_id,
-        "uptime": 0,
-        "packets_sent": 0,
-        "packets_received": 0,
-        "errors": 0,
-        "cpu_usage": 0.0,
-        "memory_usage": 0.0
+        "metric": metric,
+        "agg": agg,
+        "devices": [{"device_id": device_id, "value": value} for device_id, value in top]
     }
 
+@router.get("/devices/{device_id}")
+async def get_device_metrics(device_id: str, request: Request):
+    """Get metrics for specific device"""
+    latest = request.app.state.telemetry_store.latest(device_id)
+    if latest is None:
+        raise HTTPException(status_code=404, detail="Device not found")
+    return {"device_id": device_id, **latest}
+
+@router.get("/devices/{device_id}/history")
+async def get_device_history(device_id: str, request: Request,
+                             metric: str = "cpu_usage", limit: Optional[int] = None):
+    """Get metric history for specific device"""
+    if metric not in METRICS:
+        raise HTTPException(status_code=400, detail=f"Unknown metric {metric}")
+    series = request.app.state.telemetry_store.series(device_id, metric, limit)
+    if series is None:
+        raise HTTPException(status_code=404, detail="Device not found")
+    return {"device_id": device_id, "metric": metric, **series}
+
 @router.get("/alerts")
-async def get_alerts():
+async def get_alerts(request: Request, limit: int = 100, severity: Optional[str] = None):
     """Get security alerts"""
+    engine = request.app.state.detection_engine
     return {
-        "alerts": [],
-        "total": 0
+        "alerts": engine.get_alerts(limit=limit, severity=severity),
+        "total": len(engine.alerts),
+        "stats": engine.stats()
     }
 
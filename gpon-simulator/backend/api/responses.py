@@ -0,0 +1,72 @@
+"""
+Response helpers for hot read routes: fast JSON encoding, field projection,
+cursor encoding and ETag/If-None-Match handling
+"""
+from fastapi import HTTPException, Request, Response
+from typing import Any, Callable, Collection, Dict, List, Optional
+import base64
+import hashlib
+import json
+import secrets
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+# Version counters restart with the process; the epoch keeps ETags from a
+# previous process (possibly with different restored data) from matching
+ETAG_EPOCH = secrets.token_hex(4)
+
+def dumps(content: Any) -> bytes:
+    """Encode JSON with orjson when available (datetimes handled natively)"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=str, separators=(",", ":")).encode()
+
+def parse_fields(fields: Optional[str], allowed: Collection[str]) -> Optional[List[str]]:
+    """Parse fields=id,status,rx_level_dbm, rejecting names outside allowed"""
+    if not fields:
+        return None
+    selected = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in selected if name not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return selected
+
+def project(model, fields: Optional[List[str]]) -> Dict[str, Any]:
+    """Pick declared fields from a model without dumping the whole object
+
+    Fields declared by other models in the same listing come back as None.
+    """
+    if fields is None:
+        return model.model_dump()
+    declared = type(model).model_fields
+    return {name: getattr(model, name) if name in declared else None for name in fields}
+
+def encode_cursor(seq: Optional[int]) -> Optional[str]:
+    if seq is None:
+        return None
+    return base64.urlsafe_b64encode(str(seq).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> int:
+    if not cursor:
+        return 0
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def cached_json(request: Request, version: int, build: Callable[[], Any]) -> Response:
+    """JSON response with an ETag derived from the process epoch, a version counter and the query
+
+    On a matching If-None-Match the body is never built or serialized.
+    """
+    query = hashlib.blake2b(str(request.url.query).encode(), digest_size=6).hexdigest()
+    etag = f'W/"{ETAG_EPOCH}-{version}-{query}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=dumps(build()), media_type="application/json", headers=headers)
@@ -1,73 +1,110 @@
 """
 Attack scenarios API
 """
-from fastapi import APIRouter, HTTPException
-from typing import List, Dict
+from fastapi import APIRouter, HTTPException, Request
+from typing import List, Dict, Optional
 
 router = APIRouter()
 
+def _run_summary(run) -> Dict:
+    return {
+        "run_id": run.run_id,
+        "scenario_id": run.scenario.id,
+        "status": run.status,
+        "running": run.status == "running",
+        "priority": run.priority,
+        "current_step": run.current_step,
+        "total_steps": len(run.scenario.steps),
+        "progress": int(100 * len(run.results) / max(1, len(run.scenario.steps))),
+        "submitted_time": run.submitted_time.isoformat(),
+        "start_time": run.start_time.isoformat() if run.start_time else None,
+        "end_time": run.end_time.isoformat() if run.end_time else None,
+        "error": run.error
+    }
+
 @router.get("/")
-async def list_scenarios():
+async def list_scenarios(request: Request):
     """List all available attack scenarios"""
-    # Mock implementation
+    runner = request.app.state.scenario_runner
     return {
         "scenarios": [
             {
-                "id": "dhcp_starvation_001",
-                "name": "DHCP Starvation and Spoofing",
-                "description": "Flood DHCP server to exhaust pool",
-                "category": "dhcp"
-            },
-            {
-                "id": "omci_unauth_001",
-                "name": "OMCI Unauthorized Modification",
-                "description": "Unauthorized OMCI operations",
-                "category": "omci"
-            },
-            {
-                "id": "arp_mitm_001",
-                "name": "ARP Spoofing and MITM",
-                "description": "ARP poisoning for MITM attack",
-                "category": "arp"
+                "id": scenario.id,
+                "name": scenario.name,
+                "description": scenario.description,
+                "category": scenario.category
             }
+            for scenario in runner.list_scenarios()
         ]
     }
 
-@router.get("/{scenario_id}")
-async def get_scenario(scenario_id: str):
-    """Get scenario details"""
+@router.get("/runs")
+async def list_runs(request: Request, scenario_id: Optional[str] = None):
+    """List active and recently finished runs"""
+    runner = request.app.state.scenario_runner
     return {
-        "id": scenario_id,
-        "name": "Mock Scenario",
-        "description": "Mock scenario description",
-        "steps": []
+        "runs": [_run_summary(run) for run in runner.get_runs(scenario_id)],
+        "scheduler": runner.scheduler.stats()
     }
 
+@router.get("/runs/{run_id}")
+async def get_run(run_id: str, request: Request):
+    """Get run status and step results"""
+    run = request.app.state.scenario_runner.get_run(run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return {**_run_summary(run), "results": run.results}
+
+@router.post("/runs/{run_id}/stop")
+async def stop_run(run_id: str, request: Request):
+    """Cancel a queued or running run"""
+    stopped = request.app.state.scenario_runner.stop_scenario(run_id)
+    if not stopped and not request.app.state.scenario_runner.get_run(run_id):
+        raise HTTPException(status_code=404, detail="Run not found")
+    return {"success": stopped, "run_id": run_id, "stopped": stopped}
+
+@router.get("/{scenario_id}")
+async def get_scenario(scenario_id: str, request: Request):
+    """Get scenario details"""
+    scenario = request.app.state.scenario_runner.get_scenario(scenario_id)
+    if not scenario:
+        raise HTTPException(status_code=404, detail="Scenario not found")
+    return scenario
+
 @router.post("/{scenario_id}/run")
-async def run_scenario(scenario_id: str):
+async def run_scenario(scenario_id: str, request: Request, priority: int = 0):
     """Run an attack scenario"""
-    return {
-        "success": True,
-        "scenario_id": scenario_id,
-        "running": True,
-        "start_time": "2024-01-01T00:00:00Z"
-    }
+    try:
+        run = await request.app.state.scenario_runner.run_scenario(scenario_id, priority=priority)
+    except ValueError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    return {"success": True, **_run_summary(run)}
 
 @router.get("/{scenario_id}/status")
-async def get_scenario_status(scenario_id: str):
-    """Get running scenario status"""
-    return {
-        "running": False,
-        "progress": 0,
-        "current_step": 0
-    }
+async def get_scenario_status(scenario_id: str, request: Request):
+    """Get status of the most recent run of a scenario"""
+    runs = request.app.state.scenario_runner.get_runs(scenario_id)
+    if not runs:
+        return {
+            "running": False,
+            "progress": 0,
+            "current_step": 0
+        }
+    latest = max(runs, key=lambda run: run.submitted_time)
+    return {**_run_summary(latest), "active_runs": sum(1 for run in runs if run.status in ("queued", "running"))}
 
 @router.post("/{scenario_id}/stop")
-async def stop_scenario(scenario_id: str):
-    """Stop a running scenario"""
+async def stop_scenario(scenario_id: str, request: Request, run_id: Optional[str] = None):
+    """Stop one run (run_id) or every active run of a scenario"""
+    runner = request.app.state.scenario_runner
+    if run_id:
+        targets = [run_id]
+    else:
+        targets = [run.run_id for run in runner.active_scenarios.values() if run.scenario.id == scenario_id]
+    stopped = [target for target in targets if runner.stop_scenario(target)]
     return {
-        "success": True,
+        "success": bool(stopped),
         "scenario_id": scenario_id,
-        "stopped": True
+        "stopped": bool(stopped),
+        "run_ids": stopped
     }
-
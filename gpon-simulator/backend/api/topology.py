@@ -1,10 +1,13 @@
 """
 Topology management API
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
 from typing import List, Dict, Optional
 from pydantic import BaseModel
 
+from api.responses import cached_json, decode_cursor, encode_cursor, parse_fields, project
+from models.device import DEVICE_FIELDS, device_parent
+
 router = APIRouter()
 
 # Import device manager from main
@@ -16,14 +19,34 @@ class TopologyRequest(BaseModel):
     data: Dict
 
 @router.get("/")
-async def get_topology():
-    """Get current topology"""
-    # Mock response for now
-    return {
-        "nodes": [],
-        "links": [],
-        "metadata": {"total_devices": 0}
-    }
+async def get_topology(request: Request, device_type: Optional[str] = None,
+                       parent: Optional[str] = None, fields: Optional[str] = None,
+                       cursor: Optional[str] = None, limit: int = Query(1000, ge=1, le=10000)):
+    """Get current topology, one page of nodes with their uplinks
+
+    Unchanged topology + same query returns 304 for a matching If-None-Match.
+    """
+    manager = request.app.state.device_manager
+    after = decode_cursor(cursor)
+    selected = parse_fields(fields, DEVICE_FIELDS)
+
+    def build():
+        devices, next_seq, total = manager.page_devices(
+            after_seq=after, limit=limit, device_type=device_type, parent=parent
+        )
+        links = []
+        for device in devices:
+            upstream = device_parent(device)
+            if upstream:
+                links.append({"source": upstream, "target": device.id})
+        return {
+            "nodes": [project(device, selected) for device in devices],
+            "links": links,
+            "next_cursor": encode_cursor(next_seq),
+            "metadata": {"total_devices": len(manager.devices), "matching": total, "version": manager.version}
+        }
+
+    return cached_json(request, manager.version, build)
 
 @router.post("/reset")
 async def reset_topology():
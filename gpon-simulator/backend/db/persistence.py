@@ -0,0 +1,417 @@
+"""
+Write-behind persistence
+Simulation code only records what changed in memory; a background task
+coalesces updates per entity and flushes them on an interval with bulk
+upserts/inserts, off the event loop. Hot paths never wait on the database.
+"""
+from typing import Any, Callable, Dict, List, Optional, Set, Union
+from collections import defaultdict, deque
+from datetime import datetime
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+
+from db.tables import metadata, devices, dhcp_leases, omci_logs, scenario_runs, PRIMARY_KEYS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATABASE_URL = "sqlite:///gpon_simulator.db"
+
+Row = Union[Dict[str, Any], Callable[[], Optional[Dict[str, Any]]]]
+
+class WriteBehindStore:
+    """Coalescing write-behind buffer in front of a SQLAlchemy engine
+
+    upsert() keeps only the latest row per primary key until the next flush;
+    rows may be given as callables so serialization also happens at flush
+    time, once per entity, instead of on every mutation. collect() builds
+    those rows on the thread that owns the live objects (the event loop);
+    write() only touches the snapshot and can run in an executor.
+
+    A failed batch is retried max_retries times in one transaction. After
+    that, if the database still answers, the batch is written one chunk per
+    transaction and chunks the database rejects are set aside in
+    dead_letters, so one bad row cannot block everything else. Pending
+    appends are capped at max_pending_appends per table, oldest dropped.
+    """
+
+    def __init__(self, url: Optional[str] = None, flush_interval_s: float = 1.0,
+                 chunk_size: int = 1000, max_retries: int = 3,
+                 max_pending_appends: int = 100_000, dead_letter_size: int = 20):
+        self.url = url or os.environ.get("DATABASE_URL", DEFAULT_DATABASE_URL)
+        connect_args = {"check_same_thread": False} if self.url.startswith("sqlite") else {}
+        self.engine = create_engine(self.url, connect_args=connect_args)
+        metadata.create_all(self.engine)
+        self.flush_interval_s = flush_interval_s
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.max_pending_appends = max_pending_appends
+        self._tables = {table.name: table for table in metadata.sorted_tables}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._async_flush_lock: Optional[asyncio.Lock] = None
+        self._upserts: Dict[str, Dict[Any, Row]] = defaultdict(dict)
+        self._deletes: Dict[str, Set[Any]] = defaultdict(set)
+        self._appends: Dict[str, deque] = defaultdict(self._append_buffer)
+        self._truncate: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._failed_flushes = 0
+        self.dead_letters: deque = deque(maxlen=dead_letter_size)
+        self.flushes = 0
+        self.rows_written = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.rows_dropped = 0
+        self.last_flush_ms = 0.0
+
+    def _append_buffer(self, rows=()) -> deque:
+        return deque(rows, maxlen=self.max_pending_appends)
+
+    # Recording (called from simulation code, O(1), no I/O)
+
+    def upsert(self, table: str, key: Any, row: Row):
+        with self._lock:
+            pending = self._upserts[table]
+            if key in pending:
+                self.coalesced += 1
+            pending[key] = row
+            self._deletes[table].discard(key)
+
+    def delete(self, table: str, key: Any):
+        with self._lock:
+            self._upserts[table].pop(key, None)
+            self._deletes[table].add(key)
+
+    def append(self, table: str, row: Dict[str, Any]):
+        with self._lock:
+            rows = self._appends[table]
+            if len(rows) == rows.maxlen:
+                self.rows_dropped += 1
+            rows.append(row)
+
+    def truncate(self, table: str):
+        with self._lock:
+            self._upserts[table].clear()
+            self._deletes[table].clear()
+            self._appends[table].clear()
+            self._truncate.add(table)
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return (sum(len(rows) for rows in self._upserts.values())
+                    + sum(len(keys) for keys in self._deletes.values())
+                    + sum(len(rows) for rows in self._appends.values()))
+
+    # Flushing
+
+    def _swap(self):
+        with self._lock:
+            batch = (self._truncate, self._deletes, self._upserts, self._appends)
+            self._truncate = set()
+            self._deletes = defaultdict(set)
+            self._upserts = defaultdict(dict)
+            self._appends = defaultdict(self._append_buffer)
+        return batch
+
+    def _requeue(self, batch):
+        """Put a failed batch back without clobbering newer changes"""
+        truncate, deletes, upserts, appends = batch
+        with self._lock:
+            self._truncate |= truncate
+            for table, keys in deletes.items():
+                for key in keys:
+                    if key not in self._upserts[table]:
+                        self._deletes[table].add(key)
+            for table, rows in upserts.items():
+                for key, row in rows.items():
+                    if key not in self._upserts[table] and key not in self._deletes[table]:
+                        self._upserts[table][key] = row
+            for table, rows in appends.items():
+                # Older rows go first; past the cap the oldest are dropped
+                merged = self._append_buffer(rows)
+                merged.extend(self._appends[table])
+                self.rows_dropped += len(rows) + len(self._appends[table]) - len(merged)
+                self._appends[table] = merged
+
+    def _upsert_statement(self, table):
+        key = PRIMARY_KEYS[table.name]
+        dialect = self.engine.dialect.name
+        if dialect in ("sqlite", "postgresql"):
+            insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+            statement = insert(table)
+            return statement.on_conflict_do_update(
+                index_elements=[key],
+                set_={c.name: statement.excluded[c.name] for c in table.columns if c.name != key},
+            )
+        return None
+
+    def collect(self):
+        """Take pending changes, building lazy rows into plain dicts
+
+        Must run on the thread that mutates the simulation objects, so rows
+        are snapshotted consistently.
+        """
+        truncate, deletes, upserts, appends = self._swap()
+        snapshot: Dict[str, Dict[Any, Dict[str, Any]]] = {}
+        for table_name, rows in upserts.items():
+            built = {key: row() if callable(row) else row for key, row in rows.items()}
+            snapshot[table_name] = {key: row for key, row in built.items() if row is not None}
+        return truncate, deletes, snapshot, {table: list(rows) for table, rows in appends.items()}
+
+    def flush(self) -> int:
+        """Collect and write pending changes from the calling thread"""
+        return self.write(self.collect())
+
+    async def flush_async(self) -> int:
+        """Collect on the loop, write in an executor; flushes never overlap"""
+        if self._async_flush_lock is None:
+            self._async_flush_lock = asyncio.Lock()
+        async with self._async_flush_lock:
+            batch = self.collect()
+            return await asyncio.get_running_loop().run_in_executor(None, self.write, batch)
+
+    def write(self, batch) -> int:
+        """Write a collected batch, returns rows written"""
+        with self._flush_lock:
+            return self._write(batch)
+
+    def _units(self, batch):
+        """Split a batch into (table, rows, execute) units in write order"""
+        truncate, deletes, snapshot, appends = batch
+        for table_name in truncate:
+            table = self._tables[table_name]
+            yield table_name, [], functools.partial(self._truncate_table, table)
+        for table_name, keys in deletes.items():
+            table = self._tables[table_name]
+            column = table.c[PRIMARY_KEYS[table_name]]
+            keys = list(keys)
+            for i in range(0, len(keys), self.chunk_size):
+                chunk = keys[i:i + self.chunk_size]
+                yield table_name, chunk, functools.partial(self._delete_chunk, table, column, chunk)
+        for table_name, rows in snapshot.items():
+            table = self._tables[table_name]
+            rows = list(rows.values())
+            for i in range(0, len(rows), self.chunk_size):
+                chunk = rows[i:i + self.chunk_size]
+                yield table_name, chunk, functools.partial(self._upsert_chunk, table, chunk)
+        for table_name, rows in appends.items():
+            table = self._tables[table_name]
+            for i in range(0, len(rows), self.chunk_size):
+                chunk = rows[i:i + self.chunk_size]
+                yield table_name, chunk, functools.partial(self._insert_chunk, table, chunk)
+
+    @staticmethod
+    def _truncate_table(table, conn) -> int:
+        conn.execute(table.delete())
+        return 0
+
+    @staticmethod
+    def _delete_chunk(table, column, keys, conn) -> int:
+        conn.execute(table.delete().where(column.in_(keys)))
+        return len(keys)
+
+    def _upsert_chunk(self, table, rows, conn) -> int:
+        statement = self._upsert_statement(table)
+        if statement is not None:
+            conn.execute(statement, rows)
+        else:
+            column = table.c[PRIMARY_KEYS[table.name]]
+            conn.execute(table.delete().where(column.in_([row[column.name] for row in rows])))
+            conn.execute(table.insert(), rows)
+        return len(rows)
+
+    @staticmethod
+    def _insert_chunk(table, rows, conn) -> int:
+        conn.execute(table.insert(), rows)
+        return len(rows)
+
+    def _reachable(self) -> bool:
+        try:
+            with self.engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return True
+        except Exception:
+            return False
+
+    def _write(self, batch) -> int:
+        started = time.perf_counter()
+        try:
+            with self.engine.begin() as conn:
+                written = sum(execute(conn) for _, _, execute in self._units(batch))
+        except Exception:
+            self.errors += 1
+            self._failed_flushes += 1
+            if self._failed_flushes < self.max_retries or not self._reachable():
+                logger.exception("Persistence flush failed, will retry")
+                self._requeue(batch)
+                return 0
+            logger.exception("Persistence flush failed %d times, writing chunks separately",
+                             self._failed_flushes)
+            written = self._write_isolated(batch)
+        self._failed_flushes = 0
+
+        if written or batch[0]:
+            self.flushes += 1
+            self.rows_written += written
+            self.last_flush_ms = round((time.perf_counter() - started) * 1000, 3)
+        return written
+
+    def _write_isolated(self, batch) -> int:
+        """Write one chunk per transaction, setting aside chunks that fail"""
+        written = 0
+        for table_name, rows, execute in self._units(batch):
+            try:
+                with self.engine.begin() as conn:
+                    written += execute(conn)
+            except Exception as exc:
+                self.rows_dropped += len(rows)
+                self.dead_letters.append({
+                    "table": table_name,
+                    "rows": rows,
+                    "error": str(exc)[:500],
+                    "failed_at": datetime.now(),
+                })
+                logger.error("Persistence set aside %d %s rows: %s", len(rows), table_name, exc)
+        return written
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval_s)
+            await self.flush_async()
+
+    def start(self):
+        """Start the periodic flush task on the running loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush task and write whatever is still pending"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush_async()
+
+    def load(self, table: str) -> List[Dict[str, Any]]:
+        """Read all rows of a table"""
+        with self.engine.connect() as conn:
+            return [dict(row._mapping) for row in conn.execute(select(self._tables[table]))]
+
+    def stats(self) -> Dict:
+        return {
+            "url": self.engine.url.render_as_string(hide_password=True),
+            "pending": self.pending,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "rows_dropped": self.rows_dropped,
+            "dead_letters": len(self.dead_letters),
+            "last_flush_ms": self.last_flush_ms,
+            "flush_interval_s": self.flush_interval_s,
+        }
+
+# Row builders
+
+def device_row(device) -> Dict[str, Any]:
+    from models.device import device_parent
+    return {
+        "id": device.id,
+        "type": device.type,
+        "name": device.name,
+        "status": device.status,
+        "parent": device_parent(device),
+        "data": device.model_dump(mode="json"),
+        "updated_at": device.updated_at,
+    }
+
+def lease_row(lease) -> Dict[str, Any]:
+    return {
+        "mac_address": lease.mac_address,
+        "ip_address": lease.ip_address,
+        "lease_time": lease.lease_time,
+        "expiry": lease.expiry,
+        "hostname": lease.hostname,
+    }
+
+def run_row(run) -> Dict[str, Any]:
+    return {
+        "run_id": run.run_id,
+        "scenario_id": run.scenario.id,
+        "status": run.status,
+        "priority": run.priority,
+        "submitted_time": run.submitted_time,
+        "start_time": run.start_time,
+        "end_time": run.end_time,
+        "error": run.error,
+        "results": run.model_dump(mode="json", include={"results"})["results"],
+    }
+
+def attach_persistence(store: WriteBehindStore, device_manager, protocol_simulator, scenario_runner):
+    """Subscribe the store to simulation changes"""
+
+    def on_device(action: str, device_id: Optional[str], device):
+        if action == "reset":
+            store.truncate(devices.name)
+        elif action == "remove":
+            store.delete(devices.name, device_id)
+        else:
+            store.upsert(devices.name, device_id, lambda: device_row(device))
+
+    def on_protocol_event(event: Dict):
+        event_type = event["type"]
+        if event_type == "dhcp_discover" and event.get("ip") and not event.get("renewed"):
+            mac = event["mac"]
+
+            def build_lease():
+                lease = protocol_simulator.dhcp_leases.get(mac)
+                return lease_row(lease) if lease is not None else None
+
+            store.upsert(dhcp_leases.name, mac, build_lease)
+        elif event_type == "dhcp_release":
+            store.delete(dhcp_leases.name, event["mac"])
+        elif event_type == "omci_command":
+            store.append(omci_logs.name, {
+                "timestamp": datetime.fromtimestamp(event["ts"]),
+                "ont_id": event["ont_id"],
+                "command": event["command"],
+                "success": event["success"],
+                "via_olt": event.get("via_olt", True),
+                "parameters": event.get("parameters", {}),
+            })
+
+    def on_run(run):
+        store.upsert(scenario_runs.name, run.run_id, lambda: run_row(run))
+
+    device_manager.add_listener(on_device)
+    protocol_simulator.add_event_listener(on_protocol_event)
+    scenario_runner.add_run_listener(on_run)
+
+def restore_state(store: WriteBehindStore, device_manager, protocol_simulator) -> Dict[str, int]:
+    """Reload devices and DHCP leases saved by a previous process"""
+    from models.device import DEVICE_TYPES
+    from models.protocols import DHCPLease
+
+    restored_devices = 0
+    for row in store.load(devices.name):
+        device_class = DEVICE_TYPES.get(row["type"])
+        if device_class is None:
+            continue
+        device_manager.add_device(device_class(**row["data"]))
+        restored_devices += 1
+
+    restored_leases = 0
+    for row in store.load(dhcp_leases.name):
+        protocol_simulator.restore_lease(DHCPLease(**row))
+        restored_leases += 1
+    return {"devices": restored_devices, "leases": restored_leases}
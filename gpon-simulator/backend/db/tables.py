@@ -0,0 +1,58 @@
+"""
+Database schema (SQLAlchemy Core)
+"""
+from sqlalchemy import (
+    JSON, Boolean, Column, DateTime, Integer, MetaData, String, Table, Text
+)
+
+metadata = MetaData()
+
+devices = Table(
+    "devices", metadata,
+    Column("id", String(64), primary_key=True),
+    Column("type", String(32), nullable=False, index=True),
+    Column("name", String(255), nullable=False),
+    Column("status", String(32), nullable=False),
+    Column("parent", String(64), index=True),
+    Column("data", JSON, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+)
+
+dhcp_leases = Table(
+    "dhcp_leases", metadata,
+    Column("mac_address", String(17), primary_key=True),
+    Column("ip_address", String(45), nullable=False, index=True),
+    Column("lease_time", Integer, nullable=False),
+    Column("expiry", DateTime, nullable=False),
+    Column("hostname", String(255)),
+)
+
+omci_logs = Table(
+    "omci_logs", metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("timestamp", DateTime, nullable=False, index=True),
+    Column("ont_id", String(64), nullable=False, index=True),
+    Column("command", String(64), nullable=False),
+    Column("success", Boolean, nullable=False),
+    Column("via_olt", Boolean, nullable=False, default=True),
+    Column("parameters", JSON, nullable=False),
+)
+
+scenario_runs = Table(
+    "scenario_runs", metadata,
+    Column("run_id", String(32), primary_key=True),
+    Column("scenario_id", String(64), nullable=False, index=True),
+    Column("status", String(16), nullable=False),
+    Column("priority", Integer, nullable=False),
+    Column("submitted_time", DateTime, nullable=False),
+    Column("start_time", DateTime),
+    Column("end_time", DateTime),
+    Column("error", Text),
+    Column("results", JSON, nullable=False),
+)
+
+PRIMARY_KEYS = {
+    devices.name: "id",
+    dhcp_leases.name: "mac_address",
+    scenario_runs.name: "run_id",
+}
@@ -9,15 +9,23 @@ from fastapi.staticfiles import StaticFiles
 from typing import List, Dict, Optional
 import json
 import asyncio
+import logging
+import os
+import time
 from datetime import datetime
 
 from models.device import DeviceManager
 from models.protocols import ProtocolSimulator
 from models.scenarios import ScenarioRunner, load_scenarios
+from models.telemetry import TelemetryStore
+from models.detection import DetectionEngine
 from api.topology import router as topology_router
 from api.devices import router as devices_router
 from api.scenarios import router as scenarios_router
 from api.metrics import router as metrics_router
+from api.admin import router as admin_router
+from tools.profiler import SamplingProfiler, MemoryProfiler
+from db.persistence import WriteBehindStore, attach_persistence, restore_state
 
 app = FastAPI(
     title="GPON Network Simulator API",
@@ -39,11 +47,40 @@ app.include_router(topology_router, prefix="/api/topology", tags=["topology"])
 app.include_router(devices_router, prefix="/api/devices", tags=["devices"])
 app.include_router(scenarios_router, prefix="/api/scenarios", tags=["scenarios"])
 app.include_router(metrics_router, prefix="/api/metrics", tags=["metrics"])
+app.include_router(admin_router, prefix="/api/admin", tags=["admin"])
 
 # Global managers
 device_manager = DeviceManager()
 protocol_simulator = ProtocolSimulator(device_manager)
 scenario_runner = ScenarioRunner(device_manager, protocol_simulator)
+# Telemetry rows are preallocated for the expected fleet and capped, so the
+# store's memory stays within max devices x metrics x history x 4 bytes
+telemetry_store = TelemetryStore(
+    capacity=int(os.environ.get("TELEMETRY_DEVICES", 1024)),
+    max_capacity=int(os.environ.get("TELEMETRY_MAX_DEVICES", 8192)),
+    history=300,
+)
+telemetry_store.attach(device_manager)
+detection_engine = DetectionEngine()
+protocol_simulator.add_event_listener(detection_engine.process)
+
+# Shared state for routers
+app.state.device_manager = device_manager
+app.state.protocol_simulator = protocol_simulator
+app.state.scenario_runner = scenario_runner
+app.state.telemetry_store = telemetry_store
+app.state.detection_engine = detection_engine
+app.state.cpu_profiler = SamplingProfiler()
+app.state.memory_profiler = MemoryProfiler()
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_INTERVAL_S = 1.0
+ACTIVATION_TICK_S = 0.5
+HEARTBEAT_INTERVAL_S = 1.0
+
+# Background loops started on startup, cancelled on shutdown
+background_tasks: List[asyncio.Task] = []
 
 # WebSocket connections
 websocket_connections: List[WebSocket] = []
@@ -53,20 +90,80 @@ async def startup_event():
     """Initialize simulator on startup"""
     # Load default scenarios
     load_scenarios()
+    background_tasks.append(asyncio.create_task(telemetry_loop()))
+    background_tasks.append(asyncio.create_task(activation_loop()))
+    scenario_runner.scheduler.lag_monitor.start()
+    # Restore saved state first so it is not written straight back
+    persistence = WriteBehindStore()
+    restored = restore_state(persistence, device_manager, protocol_simulator)
+    attach_persistence(persistence, device_manager, protocol_simulator, scenario_runner)
+    persistence.start()
+    app.state.persistence = persistence
     print("GPON Simulator started")
+    print(f"Restored from {persistence.stats()['url']}: {restored}")
     print(f"Device manager initialized: {len(device_manager.devices)} devices")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop running scenarios and background loops"""
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    await scenario_runner.scheduler.shutdown()
+    if getattr(app.state, "persistence", None):
+        await app.state.persistence.stop()
+
+async def telemetry_loop():
+    """Sample per-device telemetry in the background"""
+    while True:
+        try:
+            telemetry_store.sample()
+        except Exception:
+            logger.exception("Telemetry sampling failed")
+        await asyncio.sleep(TELEMETRY_INTERVAL_S)
+
+async def activation_loop():
+    """Advance the ONT activation clock in real time"""
+    loop = asyncio.get_running_loop()
+    last = loop.time()
+    while True:
+        await asyncio.sleep(ACTIVATION_TICK_S)
+        now = loop.time()
+        try:
+            protocol_simulator.activation.advance(now - last)
+        except Exception:
+            logger.exception("ONT activation step failed")
+        last = now
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket endpoint for real-time updates"""
     await websocket.accept()
     websocket_connections.append(websocket)
+    loop = asyncio.get_running_loop()
+    next_beat = loop.time() + HEARTBEAT_INTERVAL_S
     try:
         while True:
-            # Keep connection alive and broadcast updates
-            await asyncio.sleep(1)
+            # Keep connection alive and broadcast updates; reading lets us
+            # notice client disconnects without waiting for a failed send.
+            # Heartbeats carry the time they were due, so any event-loop
+            # delay before the send shows up as message lag on the client.
+            remaining = next_beat - loop.time()
+            due = datetime.fromtimestamp(time.time() + remaining)
+            try:
+                await asyncio.wait_for(websocket.receive_text(), timeout=max(0.0, remaining))
+            except asyncio.TimeoutError:
+                await websocket.send_json({
+                    "type": "heartbeat",
+                    "timestamp": due.isoformat()
+                })
+                now = loop.time()
+                while next_beat <= now:
+                    next_beat += HEARTBEAT_INTERVAL_S
     except:
-        websocket_connections.remove(websocket)
+        if websocket in websocket_connections:
+            websocket_connections.remove(websocket)
 
 async def broadcast_update(message: Dict):
     """Broadcast update to all WebSocket clients"""
@@ -74,7 +171,22 @@ async def broadcast_update(message: Dict):
         try:
             await ws.send_json(message)
         except:
-            websocket_connections.remove(ws)
+            if ws in websocket_connections:
+                websocket_connections.remove(ws)
+
+def on_alert(alert):
+    """Push new security alerts to WebSocket clients"""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    loop.create_task(broadcast_update({
+        "type": "alert",
+        "alert": alert.model_dump(mode="json"),
+        "timestamp": datetime.now().isoformat()
+    }))
+
+detection_engine.add_listener(on_alert)
 
 @app.get("/")
 async def root():
@@ -93,6 +205,8 @@ async def get_status():
         "running": True,
         "devices_count": len(device_manager.devices),
         "active_scenarios": len(scenario_runner.active_scenarios),
+        "alerts": len(detection_engine.alerts),
+        "scheduler": scenario_runner.scheduler.stats(),
         "metrics": await protocol_simulator.get_summary_metrics()
     }
 
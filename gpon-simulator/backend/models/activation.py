@@ -0,0 +1,529 @@
+"""
+ONT activation engine
+Discrete-event model of G.984.3 activation per PON port: serial-number
+discovery windows, PLOAM ranging, authorization against the OLT's
+allowed-serial table and OMCI provisioning, on a simulated clock so that
+mass re-registration storms (OLT reboot, power events) can be replayed
+in real time or fast-forwarded.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import BaseModel, Field
+from collections import deque
+from datetime import datetime
+import hashlib
+import heapq
+import itertools
+import math
+import random
+
+from models.scheduler import checkpoint
+from models.stats import percentile
+
+# ONT activation states (G.984.3 clause 10)
+O1_INITIAL = "O1"
+O2_STANDBY = "O2"
+O3_SERIAL_NUMBER = "O3"
+O4_RANGING = "O4"
+O5_OPERATION = "O5"
+
+FIBER_DELAY_US_PER_KM = 5.0
+MAX_REACH_KM = 20.0
+
+class AuthEntry(BaseModel):
+    """Allowed-serial table entry: where the ONT may register"""
+    serial_number: str
+    olt_id: Optional[str]
+    pon_port: str
+
+class OntActivation:
+    """Activation state of one ONT"""
+
+    __slots__ = ("ont_id", "serial_number", "port", "state", "generation", "onu_id",
+                 "distance_km", "eqd_us", "rejected", "in_service", "report", "outage_at")
+
+    def __init__(self, ont_id: str, serial_number: str, port: Tuple[Optional[str], str],
+                 distance_km: float):
+        self.ont_id = ont_id
+        self.serial_number = serial_number
+        self.port = port
+        self.state = O5_OPERATION
+        self.generation = 0  # bumped on every outage; stale events are ignored
+        self.onu_id: Optional[int] = None
+        self.distance_km = distance_km
+        self.eqd_us = 0.0
+        self.rejected = False
+        self.in_service = True
+        self.report: Optional["RecoveryReport"] = None
+        self.outage_at = 0.0
+
+class PonPort:
+    """Per-port discovery and OMCI provisioning state"""
+
+    def __init__(self, olt_id: Optional[str], pon_port: str, max_onus: int, phase_s: float):
+        self.olt_id = olt_id
+        self.pon_port = pon_port
+        self.phase_s = phase_s
+        self.up_at = 0.0  # OLT port accepts activation from this time on
+        self.waiting: Dict[str, OntActivation] = {}  # O3 ONTs answering SN requests
+        self.free_onu_ids: List[int] = list(range(max_onus))
+        self.window_pending = False
+        self.omci_queue: deque = deque()
+        self.omci_busy = 0
+        self.windows = 0
+        self.collisions = 0
+
+class RecoveryReport(BaseModel):
+    """Progress of one outage until every affected ONT is back in service"""
+    report_id: str
+    kind: str  # olt_reboot, power_event, ont_reboot
+    target: str
+    started_at: datetime = Field(default_factory=datetime.now)
+    sim_start_s: float
+    onts_total: int
+    onts_in_service: int = 0
+    pon_ports: int = 0
+    time_to_first_service_s: Optional[float] = None
+    time_to_full_service_s: Optional[float] = None
+    p50_service_s: Optional[float] = None
+    p95_service_s: Optional[float] = None
+    discovery_windows: int = 0
+    sn_collisions: int = 0
+    ranging_failures: int = 0
+    rejected_serials: List[str] = []
+    mib_resyncs: int = 0
+    completed: bool = False
+    service_times: List[float] = Field(default=[], exclude=True)
+
+    def record_service(self, elapsed_s: float):
+        self.onts_in_service += 1
+        self.service_times.append(elapsed_s)
+        if self.time_to_first_service_s is None:
+            self.time_to_first_service_s = round(elapsed_s, 3)
+        self.check_complete()
+
+    def check_complete(self):
+        """Finish once every ONT still counted is in service or rejected"""
+        if not self.completed and self.onts_in_service >= self.onts_total - len(self.rejected_serials):
+            self.finish()
+
+    def finish(self):
+        times = sorted(self.service_times)
+        if times:
+            self.time_to_full_service_s = round(times[-1], 3)
+            self.p50_service_s = round(percentile(times, 50), 3)
+            self.p95_service_s = round(percentile(times, 95), 3)
+        self.completed = True
+
+class ActivationEngine:
+    """Activation of all ONTs, driven by a simulated clock
+
+    Each PON port opens a serial-number discovery window every
+    discovery_interval_s while ONTs are waiting. ONTs answer with a random
+    delay; responses landing in the same slot collide and are lost. At most
+    max_ranging_per_window captured ONTs are ranged per window, the rest
+    retry in the next one. Authorized ONTs are then provisioned over OMCI,
+    with omci_concurrency sessions per port; ONTs whose MIB data sync
+    counter still matches the OLT's copy skip the full download.
+    """
+
+    def __init__(self, device_manager, omci_mib, discovery_interval_s: float = 1.0,
+                 max_ranging_per_window: int = 16, sn_slots: int = 256,
+                 ranging_time_s: float = 0.125, ranging_failure_rate: float = 0.01,
+                 omci_concurrency: int = 8, omci_sync_check_s: float = 0.5,
+                 omci_per_entity_s: float = 0.05, ont_boot_time_s: Tuple[float, float] = (40.0, 70.0),
+                 olt_boot_time_s: float = 90.0, max_onus_per_port: int = 128,
+                 max_reports: int = 200, seed: Optional[int] = None):
+        self.device_manager = device_manager
+        self.omci_mib = omci_mib
+        self.discovery_interval_s = discovery_interval_s
+        self.max_ranging_per_window = max_ranging_per_window
+        self.sn_slots = sn_slots
+        self.ranging_time_s = ranging_time_s
+        self.ranging_failure_rate = ranging_failure_rate
+        self.omci_concurrency = omci_concurrency
+        self.omci_sync_check_s = omci_sync_check_s
+        self.omci_per_entity_s = omci_per_entity_s
+        self.ont_boot_time_s = ont_boot_time_s
+        self.olt_boot_time_s = olt_boot_time_s
+        self.max_onus_per_port = max_onus_per_port
+        self.max_reports = max_reports
+        self.rng = random.Random(seed)
+
+        self.clock = 0.0  # simulated seconds
+        self._events: List[Tuple[float, int, str, Any, int]] = []  # (time, seq, kind, target, generation)
+        self._seq = itertools.count()
+        self.onts: Dict[str, OntActivation] = {}
+        self.ports: Dict[Tuple[Optional[str], str], PonPort] = {}
+        self.allowed: Dict[str, AuthEntry] = {}  # serial -> entry
+        self.reports: Dict[str, RecoveryReport] = {}
+        self._report_ids = itertools.count(1)
+        self.events_processed = 0
+
+    # Authorization table
+
+    def _allow(self, serial_number: str, olt_id: Optional[str], pon_port: str):
+        self.allowed[serial_number] = AuthEntry(serial_number=serial_number, olt_id=olt_id,
+                                                pon_port=pon_port)
+
+    def _mark_authorized(self, serial_number: str, authorized: bool):
+        for ont in self.device_manager.list_devices("ONT"):
+            if ont.serial_number == serial_number and ont.authorized != authorized:
+                self.device_manager.update_device(ont.id, authorized=authorized)
+
+    def authorize(self, serial_number: str, olt_id: Optional[str], pon_port: str):
+        """Allow a serial on a port; rejected ONTs with it rejoin discovery"""
+        self._allow(serial_number, olt_id, pon_port)
+        self._mark_authorized(serial_number, True)
+        for state in self.onts.values():
+            if state.serial_number != serial_number or not state.rejected:
+                continue
+            state.rejected = False
+            report = state.report
+            if report is not None and not report.completed and serial_number in report.rejected_serials:
+                report.rejected_serials.remove(serial_number)
+            port = self._port(state.port)
+            if state.ont_id in port.waiting:
+                self._schedule_window(port)
+
+    def revoke(self, serial_number: str) -> bool:
+        """Remove a serial from the table; its ONTs are rejected on their next activation"""
+        self._mark_authorized(serial_number, False)
+        return self.allowed.pop(serial_number, None) is not None
+
+    def is_authorized(self, serial_number: str, port: Tuple[Optional[str], str]) -> bool:
+        entry = self.allowed.get(serial_number)
+        return entry is not None and (entry.olt_id, entry.pon_port) == port
+
+    # Registration
+
+    @staticmethod
+    def _distance_km(ont) -> float:
+        """Fiber distance from config, else a stable pseudo-random 0.5-20 km"""
+        if "distance_km" in ont.config:
+            return float(ont.config["distance_km"])
+        digest = hashlib.blake2b(ont.id.encode(), digest_size=4).digest()
+        return 0.5 + (int.from_bytes(digest, "big") / 0xFFFFFFFF) * (MAX_REACH_KM - 0.5)
+
+    def _port(self, key: Tuple[Optional[str], str]) -> PonPort:
+        port = self.ports.get(key)
+        if port is None:
+            port = PonPort(key[0], key[1], self.max_onus_per_port,
+                           phase_s=self.rng.random() * self.discovery_interval_s)
+            self.ports[key] = port
+        return port
+
+    def _state(self, ont) -> OntActivation:
+        """Activation state of an ONT, registering it on first use"""
+        key = (ont.olt_id, ont.pon_port)
+        state = self.onts.get(ont.id)
+        if state is None or state.port != key or state.serial_number != ont.serial_number:
+            state = OntActivation(ont.id, ont.serial_number, key, self._distance_km(ont))
+            state.in_service = ont.status == "online"
+            self.onts[ont.id] = state
+        # ONTs provisioned as authorized seed the allowed-serial table
+        if ont.authorized and ont.serial_number not in self.allowed:
+            self._allow(ont.serial_number, ont.olt_id, ont.pon_port)
+        return state
+
+    # Outages
+
+    def _schedule(self, at: float, kind: str, target: Any, generation: int = 0):
+        heapq.heappush(self._events, (at, next(self._seq), kind, target, generation))
+
+    def _take_down(self, state: OntActivation, report: RecoveryReport, ready_at: float):
+        """Drop an ONT to O1 and schedule it to reach O3 at ready_at"""
+        port = self._port(state.port)
+        port.waiting.pop(state.ont_id, None)
+        if state.onu_id is not None:
+            port.free_onu_ids.append(state.onu_id)
+            state.onu_id = None
+        previous = state.report
+        if (previous is not None and not previous.completed and previous is not report
+                and not state.in_service):
+            # Still recovering: the ONT now counts towards the new outage instead
+            previous.onts_total -= 1
+            if state.rejected and state.serial_number in previous.rejected_serials:
+                previous.rejected_serials.remove(state.serial_number)
+            previous.check_complete()
+        state.generation += 1
+        state.state = O1_INITIAL
+        state.rejected = False
+        state.in_service = False
+        state.report = report
+        state.outage_at = self.clock
+        self.device_manager.update_device(state.ont_id, status="offline")
+        self._schedule(ready_at, "ready", state.ont_id, state.generation)
+
+    def _start(self, kind: str, target: str, onts: List, olt_up_at: Optional[float],
+               ont_ready) -> RecoveryReport:
+        report = RecoveryReport(
+            report_id=f"rec-{next(self._report_ids)}",
+            kind=kind,
+            target=target,
+            sim_start_s=round(self.clock, 3),
+            onts_total=len(onts),
+        )
+        self.reports[report.report_id] = report
+        while len(self.reports) > self.max_reports:
+            self.reports.pop(next(iter(self.reports)))
+        ports = set()
+        for ont in onts:
+            state = self._state(ont)
+            ports.add(state.port)
+            self._take_down(state, report, ont_ready())
+        report.pon_ports = len(ports)
+        if olt_up_at is not None:
+            for key in ports:
+                self._port(key).up_at = olt_up_at
+        if not onts:
+            report.finish()
+        return report
+
+    def _olt_onts(self, olt_id: str) -> List:
+        return [ont for ont in self.device_manager.list_devices("ONT") if ont.olt_id == olt_id]
+
+    def reboot_olt(self, olt_id: str) -> RecoveryReport:
+        """OLT restarts; its ONTs lose downstream sync and re-register once it is back"""
+        olt_up = self.clock + self.olt_boot_time_s
+        self.device_manager.update_device(olt_id, status="offline")
+        self._schedule(olt_up, "olt_up", olt_id)
+        # ONTs re-acquire downstream frame sync shortly after the OLT transmits again
+        return self._start("olt_reboot", olt_id, self._olt_onts(olt_id), olt_up,
+                           lambda: olt_up + self.rng.uniform(0.5, 2.0))
+
+    def power_event(self, olt_id: str) -> RecoveryReport:
+        """Site power loss: the OLT and every ONT behind it boot from scratch"""
+        olt_up = self.clock + self.olt_boot_time_s
+        self.device_manager.update_device(olt_id, status="offline")
+        self._schedule(olt_up, "olt_up", olt_id)
+        low, high = self.ont_boot_time_s
+        return self._start("power_event", olt_id, self._olt_onts(olt_id), olt_up,
+                           lambda: self.clock + self.rng.uniform(low, high))
+
+    def reboot_ont(self, ont) -> RecoveryReport:
+        """Single ONT reboot (e.g. OMCI reboot command)"""
+        low, high = self.ont_boot_time_s
+        return self._start("ont_reboot", ont.id, [ont], None,
+                           lambda: self.clock + self.rng.uniform(low, high))
+
+    # Event processing
+
+    def _join_discovery(self, state: OntActivation):
+        state.state = O3_SERIAL_NUMBER
+        port = self._port(state.port)
+        port.waiting[state.ont_id] = state
+        self._schedule_window(port)
+
+    def _schedule_window(self, port: PonPort):
+        if port.window_pending:
+            return
+        # Windows are periodic per port, aligned to the port's phase
+        start = max(self.clock, port.up_at)
+        periods = math.ceil((start - port.phase_s) / self.discovery_interval_s)
+        at = port.phase_s + max(periods, 0) * self.discovery_interval_s
+        port.window_pending = True
+        self._schedule(at, "window", port)
+
+    def _discovery_window(self, port: PonPort):
+        port.window_pending = False
+        if not port.waiting:
+            return
+        port.windows += 1
+        reports: Dict[str, RecoveryReport] = {}
+
+        # Every waiting ONT answers with a random delay; shared slots collide
+        slots: Dict[int, List[OntActivation]] = {}
+        for state in port.waiting.values():
+            slots.setdefault(self.rng.randrange(self.sn_slots), []).append(state)
+            if state.report is not None:
+                reports[state.report.report_id] = state.report
+        for report in reports.values():
+            report.discovery_windows += 1
+
+        admitted = 0
+        for slot in sorted(slots):
+            group = slots[slot]
+            if len(group) > 1:
+                port.collisions += len(group)
+                for state in group:
+                    if state.report is not None:
+                        state.report.sn_collisions += 1
+                continue
+            state = group[0]
+            if not self.is_authorized(state.serial_number, state.port):
+                if not state.rejected:
+                    state.rejected = True
+                    if state.report is not None:
+                        state.report.rejected_serials.append(state.serial_number)
+                        state.report.check_complete()
+                continue
+            if admitted >= self.max_ranging_per_window or not port.free_onu_ids:
+                continue
+            # Assign_ONU-ID, then ranging
+            del port.waiting[state.ont_id]
+            state.onu_id = port.free_onu_ids.pop()
+            state.state = O4_RANGING
+            admitted += 1
+            self._schedule(self.clock + self.ranging_time_s, "ranged", state.ont_id, state.generation)
+
+        # Unauthorized ONTs keep answering, but only authorized ones keep windows open
+        if any(not state.rejected for state in port.waiting.values()):
+            port.window_pending = True
+            self._schedule(self.clock + self.discovery_interval_s, "window", port)
+
+    def _ranged(self, state: OntActivation):
+        port = self._port(state.port)
+        if self.rng.random() < self.ranging_failure_rate:
+            if state.report is not None:
+                state.report.ranging_failures += 1
+            port.free_onu_ids.append(state.onu_id)
+            state.onu_id = None
+            self._join_discovery(state)
+            return
+        # Equalization delay pads every ONT to the round trip of the farthest reach
+        rtd_us = 2 * state.distance_km * FIBER_DELAY_US_PER_KM
+        state.eqd_us = round(2 * MAX_REACH_KM * FIBER_DELAY_US_PER_KM - rtd_us, 3)
+        state.state = O5_OPERATION
+        port.omci_queue.append((state.ont_id, state.generation))
+        self._start_provisioning(port)
+
+    def _start_provisioning(self, port: PonPort):
+        while port.omci_queue and port.omci_busy < self.omci_concurrency:
+            ont_id, generation = port.omci_queue.popleft()
+            state = self.onts.get(ont_id)
+            ont = self.device_manager.get_device(ont_id)
+            if state is None or ont is None or state.generation != generation:
+                continue
+            duration = self.omci_sync_check_s
+            known = ont_id in self.omci_mib.ont_mibs
+            mib, _ = self.omci_mib.ensure(ont)
+            if not known:
+                # Fresh ONT: full MIB download
+                duration += mib.entity_count() * self.omci_per_entity_s
+            else:
+                result = self.omci_mib.audit(ont_id, repair=True)
+                if result is not None and not result.in_sync:
+                    duration += result.entities_uploaded * self.omci_per_entity_s
+                    if state.report is not None:
+                        state.report.mib_resyncs += 1
+            port.omci_busy += 1
+            self._schedule(self.clock + duration, "provisioned", ont_id, generation)
+
+    def _provisioned(self, ont_id: str, generation: int):
+        state = self.onts.get(ont_id)
+        if state is None:
+            return
+        port = self._port(state.port)
+        port.omci_busy -= 1
+        if state.generation == generation:
+            state.in_service = True
+            self.device_manager.update_device(ont_id, status="online", authorized=True)
+            report = state.report
+            if report is not None and not report.completed:
+                report.record_service(self.clock - state.outage_at)
+        self._start_provisioning(port)
+
+    def _dispatch(self, kind: str, target: Any, generation: int):
+        if kind == "window":
+            self._discovery_window(target)
+        elif kind == "olt_up":
+            self.device_manager.update_device(target, status="online")
+        elif kind == "provisioned":
+            self._provisioned(target, generation)
+        else:
+            state = self.onts.get(target)
+            if state is None or state.generation != generation:
+                return
+            if kind == "ready":
+                port = self._port(state.port)
+                if self.clock < port.up_at:
+                    state.state = O2_STANDBY
+                    self._schedule(port.up_at, "ready", target, generation)
+                else:
+                    self._join_discovery(state)
+            elif kind == "ranged":
+                self._ranged(state)
+
+    def advance(self, seconds: float) -> int:
+        """Run events due within the next `seconds` of simulated time"""
+        until = self.clock + seconds
+        processed = 0
+        while self._events and self._events[0][0] <= until:
+            at, _, kind, target, generation = heapq.heappop(self._events)
+            self.clock = max(self.clock, at)
+            self._dispatch(kind, target, generation)
+            processed += 1
+        self.clock = until
+        self.events_processed += processed
+        return processed
+
+    def _step(self, deadline: float) -> bool:
+        """Run the next event due by deadline, False when there is none"""
+        if not self._events or self._events[0][0] > deadline:
+            return False
+        at, _, kind, target, generation = heapq.heappop(self._events)
+        self.clock = max(self.clock, at)
+        self._dispatch(kind, target, generation)
+        self.events_processed += 1
+        return True
+
+    def run_until_idle(self, max_seconds: float = 3600.0) -> float:
+        """Fast-forward until no authorized ONT is left activating, returns simulated seconds"""
+        start = self.clock
+        while self._step(start + max_seconds):
+            pass
+        return round(self.clock - start, 3)
+
+    async def run_until_idle_async(self, max_seconds: float = 3600.0) -> float:
+        """run_until_idle that yields to the event loop between time slices"""
+        start = self.clock
+        while self._step(start + max_seconds):
+            await checkpoint()
+        return round(self.clock - start, 3)
+
+    # Reporting
+
+    def get_report(self, report_id: str) -> Optional[RecoveryReport]:
+        return self.reports.get(report_id)
+
+    def get_state(self, ont_id: str) -> Optional[Dict]:
+        state = self.onts.get(ont_id)
+        if state is None:
+            return None
+        return {
+            "ont_id": state.ont_id,
+            "serial_number": state.serial_number,
+            "olt_id": state.port[0],
+            "pon_port": state.port[1],
+            "state": state.state,
+            "onu_id": state.onu_id,
+            "distance_km": round(state.distance_km, 3),
+            "eqd_us": state.eqd_us,
+            "in_service": state.in_service,
+            "rejected": state.rejected,
+        }
+
+    def stats(self) -> Dict:
+        states: Dict[str, int] = {}
+        for state in self.onts.values():
+            states[state.state] = states.get(state.state, 0) + 1
+        return {
+            "clock_s": round(self.clock, 3),
+            "onts": len(self.onts),
+            "states": states,
+            "pon_ports": len(self.ports),
+            "allowed_serials": len(self.allowed),
+            "pending_events": len(self._events),
+            "events_processed": self.events_processed,
+            "discovery_windows": sum(port.windows for port in self.ports.values()),
+            "sn_collisions": sum(port.collisions for port in self.ports.values()),
+        }
+
+    def reset(self):
+        self.clock = 0.0
+        self._events.clear()
+        self.onts.clear()
+        self.ports.clear()
+        self.allowed.clear()
+        self.reports.clear()
+        self.events_processed = 0
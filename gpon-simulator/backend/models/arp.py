@@ -0,0 +1,334 @@
+"""
+ARP / neighbor table engine
+Per-device ARP caches with expiry, a global change journal with bounded
+per-IP history, and batched processing of gratuitous ARP.
+"""
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from collections import OrderedDict, deque
+import time
+
+class ArpCache:
+    """Neighbor cache of one device
+
+    Entries are kept in update order; with a single TTL that is also expiry
+    order, so sweeping expired entries only ever pops from the front.
+    """
+
+    def __init__(self, ttl_s: float = 300.0, max_entries: int = 1024,
+                 on_drop: Optional[Callable[[str], None]] = None):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()  # ip -> (mac, expires)
+        self._on_drop = on_drop  # called with the IP when an entry is evicted or expires
+
+    def _dropped(self, ip_address: str):
+        if self._on_drop is not None:
+            self._on_drop(ip_address)
+
+    def learn(self, ip_address: str, mac_address: str, now: float) -> Optional[str]:
+        """Insert or refresh an entry, returns the previous MAC"""
+        previous = self._entries.pop(ip_address, None)
+        self._entries[ip_address] = (mac_address, now + self.ttl_s)
+        if len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._dropped(evicted)
+        return previous[0] if previous else None
+
+    def lookup(self, ip_address: str, now: float) -> Optional[str]:
+        entry = self._entries.get(ip_address)
+        if entry is None:
+            return None
+        if entry[1] <= now:
+            del self._entries[ip_address]
+            self._dropped(ip_address)
+            return None
+        return entry[0]
+
+    def __contains__(self, ip_address: str) -> bool:
+        return ip_address in self._entries
+
+    def forget(self, ip_address: str) -> bool:
+        return self._entries.pop(ip_address, None) is not None
+
+    def expire(self, now: float) -> int:
+        """Drop expired entries, returns how many"""
+        expired = 0
+        while self._entries:
+            ip_address, (_, expires) = next(iter(self._entries.items()))
+            if expires > now:
+                break
+            self._entries.popitem(last=False)
+            self._dropped(ip_address)
+            expired += 1
+        return expired
+
+    def entries(self, now: float) -> Dict[str, str]:
+        self.expire(now)
+        return {ip: mac for ip, (mac, _) in self._entries.items()}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class IpHistory:
+    """Bounded claim history and conflict state of one IP"""
+
+    __slots__ = ("owner", "changes", "claimants", "last_conflict", "conflicts")
+
+    def __init__(self, history: int):
+        self.owner: Optional[str] = None
+        self.changes: deque = deque(maxlen=history)  # (ts, mac, previous_mac, source)
+        self.claimants: "OrderedDict[str, float]" = OrderedDict()  # mac -> last claim ts
+        self.last_conflict = 0.0
+        self.conflicts = 0
+
+class ArpJournal:
+    """Global journal of IP -> MAC claims with bounded per-IP history"""
+
+    def __init__(self, history_per_ip: int = 32, max_ips: int = 65536, recent: int = 1000):
+        self.history_per_ip = history_per_ip
+        self.max_ips = max_ips
+        self._ips: "OrderedDict[str, IpHistory]" = OrderedDict()
+        self.recent: deque = deque(maxlen=recent)
+        self.total_changes = 0
+
+    def record(self, ip_address: str, mac_address: str, source: str,
+               now: float, count: int = 1) -> Tuple[Optional[str], bool]:
+        """Record a claim, returns (previous owner, whether the owner changed)"""
+        entry = self._ips.get(ip_address)
+        if entry is None:
+            entry = IpHistory(self.history_per_ip)
+            self._ips[ip_address] = entry
+            if len(self._ips) > self.max_ips:
+                self._ips.popitem(last=False)
+        else:
+            self._ips.move_to_end(ip_address)
+
+        previous = entry.owner
+        changed = previous != mac_address
+        entry.claimants.pop(mac_address, None)
+        entry.claimants[mac_address] = now
+        if len(entry.claimants) > self.history_per_ip:
+            entry.claimants.popitem(last=False)
+        if changed:
+            entry.owner = mac_address
+            entry.changes.append((now, mac_address, previous, source))
+            self.recent.append({"ts": now, "ip": ip_address, "mac": mac_address,
+                                "previous_mac": previous, "source": source, "count": count})
+            self.total_changes += 1
+            if previous is not None:
+                entry.last_conflict = now
+                entry.conflicts += 1
+        return previous, changed
+
+    def release(self, ip_address: str):
+        """Forget the current owner (lease released), keeping history"""
+        entry = self._ips.get(ip_address)
+        if entry is not None:
+            entry.owner = None
+
+    def owner(self, ip_address: str) -> Optional[str]:
+        entry = self._ips.get(ip_address)
+        return entry.owner if entry else None
+
+    def claimants(self, ip_address: str, window_s: float, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """MACs that claimed the IP in the last window_s seconds, newest first"""
+        entry = self._ips.get(ip_address)
+        if entry is None:
+            return []
+        now = time.time() if now is None else now
+        result = []
+        for mac, seen in reversed(entry.claimants.items()):
+            if now - seen > window_s:
+                break
+            result.append({"mac": mac, "last_seen": seen, "owner": mac == entry.owner})
+        return result
+
+    def in_conflict(self, ip_address: str, window_s: float, now: Optional[float] = None) -> bool:
+        """Whether ownership of the IP was contested in the last window_s seconds"""
+        entry = self._ips.get(ip_address)
+        if entry is None or not entry.conflicts:
+            return False
+        now = time.time() if now is None else now
+        return now - entry.last_conflict <= window_s
+
+    def history(self, ip_address: str) -> List[Dict[str, Any]]:
+        entry = self._ips.get(ip_address)
+        if entry is None:
+            return []
+        return [
+            {"ts": ts, "mac": mac, "previous_mac": previous, "source": source}
+            for ts, mac, previous, source in entry.changes
+        ]
+
+    def conflicts(self, window_s: float, now: Optional[float] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """IPs contested within the window, most recently used first"""
+        now = time.time() if now is None else now
+        result = []
+        for ip_address, entry in reversed(self._ips.items()):
+            if entry.conflicts and now - entry.last_conflict <= window_s:
+                result.append({"ip": ip_address, "owner": entry.owner,
+                               "conflicts": entry.conflicts, "last_conflict": entry.last_conflict})
+                if len(result) >= limit:
+                    break
+        return result
+
+    def __len__(self) -> int:
+        return len(self._ips)
+
+    def clear(self):
+        self._ips.clear()
+        self.recent.clear()
+        self.total_changes = 0
+
+class ArpEngine:
+    """Per-device ARP caches plus the global journal"""
+
+    def __init__(self, ttl_s: float = 300.0, cache_size: int = 1024,
+                 history_per_ip: int = 32, max_pending: int = 100_000):
+        self.ttl_s = ttl_s
+        self.cache_size = cache_size
+        self.caches: Dict[str, ArpCache] = {}
+        self.journal = ArpJournal(history_per_ip=history_per_ip)
+        # ip -> devices whose cache holds it, so gratuitous ARP only touches those;
+        # pruned as caches evict or expire entries, so it never outgrows the caches
+        self._holders: Dict[str, Set[str]] = {}
+        self._pending: deque = deque(maxlen=max_pending)
+        self.dropped = 0
+        self.processed = 0
+        self._listeners: List[Callable[[str, str, Optional[str], str, int], None]] = []
+
+    def add_listener(self, callback: Callable[[str, str, Optional[str], str, int], None]):
+        """Called as (ip, mac, previous_mac, source, changes) on ownership changes"""
+        self._listeners.append(callback)
+
+    def cache(self, device_id: str) -> ArpCache:
+        cache = self.caches.get(device_id)
+        if cache is None:
+            cache = ArpCache(self.ttl_s, self.cache_size,
+                             on_drop=lambda ip_address: self._release_holder(ip_address, device_id))
+            self.caches[device_id] = cache
+        return cache
+
+    def _release_holder(self, ip_address: str, device_id: str):
+        holders = self._holders.get(ip_address)
+        if holders is not None:
+            holders.discard(device_id)
+            if not holders:
+                del self._holders[ip_address]
+
+    def learn(self, device_id: str, ip_address: str, mac_address: str,
+              source: str = "reply", now: Optional[float] = None, count: int = 1) -> Optional[str]:
+        """A device learns ip -> mac; the claim is journaled"""
+        now = time.time() if now is None else now
+        self.cache(device_id).learn(ip_address, mac_address, now)
+        self._holders.setdefault(ip_address, set()).add(device_id)
+        previous, changed = self.journal.record(ip_address, mac_address, source, now, count)
+        if changed:
+            for callback in self._listeners:
+                callback(ip_address, mac_address, previous, source, count)
+        return previous
+
+    def resolve(self, device_id: str, ip_address: str, now: Optional[float] = None) -> Optional[str]:
+        """Cache lookup, falling back to an ARP request answered by the current owner"""
+        now = time.time() if now is None else now
+        mac = self.cache(device_id).lookup(ip_address, now)
+        if mac is not None:
+            return mac
+        owner = self.journal.owner(ip_address)
+        if owner is not None:
+            self.cache(device_id).learn(ip_address, owner, now)
+            self._holders.setdefault(ip_address, set()).add(device_id)
+        return owner
+
+    def forget(self, ip_address: str):
+        """Remove an IP from every cache holding it"""
+        for device_id in self._holders.pop(ip_address, ()):
+            cache = self.caches.get(device_id)
+            if cache:
+                cache.forget(ip_address)
+        self.journal.release(ip_address)
+
+    def submit_gratuitous(self, ip_address: str, mac_address: str, sender_id: Optional[str] = None):
+        """Queue a gratuitous ARP; oldest entries drop when the queue is full"""
+        if len(self._pending) == self._pending.maxlen:
+            self.dropped += 1
+        self._pending.append((ip_address, mac_address, sender_id))
+
+    def process_batch(self, max_items: int = 1024, extra_receivers: Iterable[str] = (),
+                      now: Optional[float] = None) -> int:
+        """Apply up to max_items queued gratuitous ARPs
+
+        Claims are grouped per IP and journaled in arrival order, with
+        repeats of the same MAC collapsed, so every ownership flip is
+        counted. Each receiver's cache is written once with the winning MAC
+        and listeners hear about each IP once per batch, with the number of
+        flips as the change count.
+        """
+        now = time.time() if now is None else now
+        per_ip: "OrderedDict[str, List[List]]" = OrderedDict()  # ip -> [[mac, count], ...]
+        taken = 0
+        while self._pending and taken < max_items:
+            ip_address, mac_address, _ = self._pending.popleft()
+            runs = per_ip.get(ip_address)
+            if runs is None:
+                runs = per_ip[ip_address] = []
+            if runs and runs[-1][0] == mac_address:
+                runs[-1][1] += 1
+            else:
+                runs.append([mac_address, 1])
+            taken += 1
+
+        receivers = list(extra_receivers)
+        for ip_address, runs in per_ip.items():
+            changes = 0
+            last_previous: Optional[str] = None
+            for mac_address, count in runs:
+                previous, changed = self.journal.record(ip_address, mac_address, "gratuitous", now, count)
+                if changed:
+                    changes += 1
+                    last_previous = previous
+            winner = runs[-1][0]
+
+            # Only refresh caches that still hold a live entry; lookup drops expired ones
+            targets = [
+                device_id for device_id in list(self._holders.get(ip_address, ()))
+                if self.caches[device_id].lookup(ip_address, now) is not None
+            ]
+            targets.extend(device_id for device_id in receivers if device_id not in targets)
+            for device_id in targets:
+                self.cache(device_id).learn(ip_address, winner, now)
+                self._holders.setdefault(ip_address, set()).add(device_id)
+            if changes:
+                for callback in self._listeners:
+                    callback(ip_address, winner, last_previous, "gratuitous", changes)
+        self.processed += taken
+        return taken
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Sweep expired entries from all caches"""
+        now = time.time() if now is None else now
+        return sum(cache.expire(now) for cache in self.caches.values())
+
+    def stats(self) -> Dict:
+        return {
+            "caches": len(self.caches),
+            "cache_entries": sum(len(cache) for cache in self.caches.values()),
+            "journal_ips": len(self.journal),
+            "holder_ips": len(self._holders),
+            "journal_changes": self.journal.total_changes,
+            "pending": len(self._pending),
+            "processed": self.processed,
+            "dropped": self.dropped,
+        }
+
+    def reset(self):
+        self.caches.clear()
+        self._holders.clear()
+        self._pending.clear()
+        self.journal.clear()
+        self.dropped = 0
+        self.processed = 0
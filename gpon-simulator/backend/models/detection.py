@@ -0,0 +1,283 @@
+"""
+Streaming security alert detection
+Rule-based engine consuming protocol events incrementally. Every rule keeps
+a bucketed sliding-window counter per key, so each event costs O(1)
+regardless of traffic volume or log size.
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from pydantic import BaseModel, Field
+from collections import OrderedDict, deque
+from datetime import datetime
+import time
+import uuid
+
+class SecurityAlert(BaseModel):
+    """Security alert raised by a detection rule"""
+    id: str
+    rule_id: str
+    name: str
+    severity: str  # low, medium, high, critical
+    key: str
+    description: str
+    observed: int  # events in window when raised / last updated
+    threshold: int
+    window_s: float
+    count: int = 1  # times the rule fired, including de-duplicated hits
+    first_seen: datetime = Field(default_factory=datetime.now)
+    last_seen: datetime = Field(default_factory=datetime.now)
+    evidence: Dict[str, Any] = {}
+
+class SlidingWindowCounter:
+    """Per-key event count over a sliding window using fixed ring buckets"""
+
+    def __init__(self, window_s: float, buckets: int = 10, max_keys: int = 100_000):
+        self.window_s = window_s
+        self.buckets = buckets
+        self.bucket_s = window_s / buckets
+        self.max_keys = max_keys
+        # key -> [bucket counts, newest bucket number, running total]
+        self._state: "OrderedDict[str, list]" = OrderedDict()
+
+    def add(self, key: str, timestamp: float, weight: int = 1) -> int:
+        """Count weight events for key, returns events in the current window"""
+        bucket = int(timestamp // self.bucket_s)
+        state = self._state.get(key)
+        if state is None:
+            state = [[0] * self.buckets, bucket, 0]
+            self._state[key] = state
+            if len(self._state) > self.max_keys:
+                self._state.popitem(last=False)
+        else:
+            self._state.move_to_end(key)
+            counts, newest, total = state
+            gap = bucket - newest
+            if gap >= self.buckets:
+                state[0] = [0] * self.buckets
+                state[2] = 0
+            elif gap > 0:
+                for step in range(1, gap + 1):
+                    index = (newest + step) % self.buckets
+                    total -= counts[index]
+                    counts[index] = 0
+                state[2] = total
+            elif gap <= -self.buckets:
+                # Older than the window, ignore
+                return state[2]
+            if gap > 0:
+                state[1] = bucket
+
+        state[0][bucket % self.buckets] += weight
+        state[2] += weight
+        return state[2]
+
+    def __len__(self) -> int:
+        return len(self._state)
+
+    def clear(self):
+        self._state.clear()
+
+class DetectionRule:
+    """Threshold rule: events of a type, grouped by key, over a window"""
+
+    def __init__(self, id: str, name: str, event_type: str, key_field: str,
+                 threshold: int, window_s: float, severity: str, description: str,
+                 condition: Optional[Callable[[Dict], bool]] = None, buckets: int = 10):
+        self.id = id
+        self.name = name
+        self.event_type = event_type
+        self.key_field = key_field
+        self.threshold = threshold
+        self.window_s = window_s
+        self.severity = severity
+        self.description = description
+        self.condition = condition
+        self.counter = SlidingWindowCounter(window_s, buckets)
+
+    def evaluate(self, event: Dict, timestamp: float) -> Optional[Tuple[str, int]]:
+        """Returns (key, observed) when the event pushes the key over threshold"""
+        if self.condition and not self.condition(event):
+            return None
+        key = str(event.get(self.key_field, "global"))
+        # Batched events (e.g. coalesced ARP updates) carry how many they stand for
+        observed = self.counter.add(key, timestamp, max(1, int(event.get("count", 1))))
+        if observed >= self.threshold:
+            return key, observed
+        return None
+
+def _is_arp_overwrite(event: Dict) -> bool:
+    previous = event.get("previous_mac")
+    return bool(previous) and previous != event.get("mac")
+
+def default_rules() -> List[DetectionRule]:
+    """Default rule set for the simulated protocols"""
+    return [
+        DetectionRule(
+            id="dhcp_discover_flood",
+            name="DHCP discover flood",
+            event_type="dhcp_discover",
+            key_field="source_mac",
+            threshold=20,
+            window_s=10.0,
+            severity="high",
+            description="Excessive DHCP DISCOVER messages from {key}",
+        ),
+        DetectionRule(
+            id="dhcp_pool_exhausted",
+            name="DHCP pool exhaustion",
+            event_type="dhcp_discover",
+            key_field="server",
+            threshold=1,
+            window_s=60.0,
+            severity="critical",
+            description="DHCP pool on {key} is exhausted, clients cannot obtain addresses",
+            condition=lambda event: event.get("ip") is None,
+        ),
+        DetectionRule(
+            id="arp_spoofing",
+            name="ARP spoofing",
+            event_type="arp_update",
+            key_field="ip",
+            threshold=1,
+            window_s=60.0,
+            severity="high",
+            description="ARP entry for {key} overwritten with a different MAC",
+            condition=_is_arp_overwrite,
+        ),
+        DetectionRule(
+            id="arp_change_rate",
+            name="ARP flapping",
+            event_type="arp_update",
+            key_field="ip",
+            threshold=5,
+            window_s=30.0,
+            severity="medium",
+            description="ARP entry for {key} changes too often",
+            condition=_is_arp_overwrite,
+        ),
+        DetectionRule(
+            id="omci_command_burst",
+            name="OMCI command burst",
+            event_type="omci_command",
+            key_field="ont_id",
+            threshold=5,
+            window_s=1.0,
+            severity="high",
+            description="Burst of OMCI commands towards ONT {key}",
+        ),
+        DetectionRule(
+            id="omci_mib_divergence",
+            name="Unauthorized OMCI modification",
+            event_type="omci_mib_divergence",
+            key_field="ont_id",
+            threshold=1,
+            window_s=60.0,
+            severity="critical",
+            description="MIB of ONT {key} diverges from the OLT configuration",
+        ),
+    ]
+
+class DetectionEngine:
+    """Evaluates detection rules over a stream of protocol events"""
+
+    def __init__(self, rules: Optional[List[DetectionRule]] = None,
+                 dedup_window_s: float = 60.0, max_alerts: int = 1000):
+        self.rules: List[DetectionRule] = []
+        self._rules_by_type: Dict[str, List[DetectionRule]] = {}
+        self.dedup_window_s = dedup_window_s
+        self.alerts: deque = deque(maxlen=max_alerts)
+        self._open: Dict[Tuple[str, str], SecurityAlert] = {}
+        self._listeners: List[Callable[[SecurityAlert], None]] = []
+        self.events_processed = 0
+        self.alerts_suppressed = 0
+        for rule in rules if rules is not None else default_rules():
+            self.add_rule(rule)
+
+    def add_rule(self, rule: DetectionRule):
+        """Register a detection rule"""
+        self.rules.append(rule)
+        self._rules_by_type.setdefault(rule.event_type, []).append(rule)
+
+    def add_listener(self, callback: Callable[[SecurityAlert], None]):
+        """Call back on every new (non de-duplicated) alert"""
+        self._listeners.append(callback)
+
+    def process(self, event: Dict) -> List[SecurityAlert]:
+        """Consume one protocol event, returns newly raised alerts"""
+        self.events_processed += 1
+        rules = self._rules_by_type.get(event.get("type"))
+        if not rules:
+            return []
+
+        timestamp = event.get("ts") or time.time()
+        raised = []
+        for rule in rules:
+            hit = rule.evaluate(event, timestamp)
+            if hit is None:
+                continue
+            alert = self._raise(rule, hit[0], hit[1], event, timestamp)
+            if alert is not None:
+                raised.append(alert)
+        return raised
+
+    def _raise(self, rule: DetectionRule, key: str, observed: int,
+               event: Dict, timestamp: float) -> Optional[SecurityAlert]:
+        now = datetime.fromtimestamp(timestamp)
+        existing = self._open.get((rule.id, key))
+        if existing is not None and (now - existing.last_seen).total_seconds() < self.dedup_window_s:
+            existing.count += 1
+            existing.observed = max(existing.observed, observed)
+            existing.last_seen = now
+            self.alerts_suppressed += 1
+            return None
+
+        alert = SecurityAlert(
+            id=f"alert-{uuid.uuid4().hex[:8]}",
+            rule_id=rule.id,
+            name=rule.name,
+            severity=rule.severity,
+            key=key,
+            description=rule.description.format(key=key),
+            observed=observed,
+            threshold=rule.threshold,
+            window_s=rule.window_s,
+            first_seen=now,
+            last_seen=now,
+            evidence={k: v for k, v in event.items() if k != "ts"},
+        )
+        self._open[(rule.id, key)] = alert
+        if len(self._open) > self.alerts.maxlen:
+            self._open.pop(next(iter(self._open)))
+        self.alerts.append(alert)
+        for callback in self._listeners:
+            callback(alert)
+        return alert
+
+    def get_alerts(self, limit: int = 100, severity: Optional[str] = None) -> List[SecurityAlert]:
+        """Most recent alerts first"""
+        alerts = reversed(self.alerts)
+        if severity:
+            alerts = (alert for alert in alerts if alert.severity == severity)
+        result = []
+        for alert in alerts:
+            if len(result) >= limit:
+                break
+            result.append(alert)
+        return result
+
+    def stats(self) -> Dict:
+        """Engine statistics"""
+        return {
+            "events_processed": self.events_processed,
+            "alerts_total": len(self.alerts),
+            "alerts_suppressed": self.alerts_suppressed,
+            "rules": [rule.id for rule in self.rules],
+        }
+
+    def reset(self):
+        """Clear alerts and rule state"""
+        self.alerts.clear()
+        self._open.clear()
+        for rule in self.rules:
+            rule.counter.clear()
+        self.events_processed = 0
+        self.alerts_suppressed = 0
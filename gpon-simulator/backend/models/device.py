@@ -1,9 +1,11 @@
 """
 Device models for GPON simulation
 """
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Callable, Tuple
 from pydantic import BaseModel, Field
 from datetime import datetime
+import bisect
+import itertools
 import uuid
 
 class Device(BaseModel):
@@ -79,15 +81,122 @@ class Server(Device):
     services: List[Dict] = []
     ip_address: str
 
+DEVICE_TYPES: Dict[str, type] = {
+    cls.model_fields["type"].default: cls
+    for cls in (OLT, ONT, Splitter, CPERouter, CPEClient, Switch, Server)
+}
+
+# Every field any device type declares; valid names for fields= projections
+DEVICE_FIELDS = frozenset(name for cls in DEVICE_TYPES.values() for name in cls.model_fields)
+
+class OrderedIndex:
+    """Device IDs in insertion order with O(log n) resume from a sequence number"""
+
+    def __init__(self):
+        self._seqs: List[int] = []
+        self._ids: List[str] = []
+        self.members: Dict[str, int] = {}  # device_id -> seq
+
+    def add(self, device_id: str, seq: int):
+        if not self._seqs or seq > self._seqs[-1]:
+            self._seqs.append(seq)
+            self._ids.append(device_id)
+        else:
+            position = bisect.bisect_left(self._seqs, seq)
+            if position < len(self._seqs) and self._seqs[position] == seq:
+                self._ids[position] = device_id  # revive a tombstone
+            else:
+                self._seqs.insert(position, seq)
+                self._ids.insert(position, device_id)
+        self.members[device_id] = seq
+
+    def remove(self, device_id: str):
+        # Lazy deletion, compacted once tombstones dominate
+        self.members.pop(device_id, None)
+        if len(self._seqs) > 2 * len(self.members) + 64:
+            pairs = [(q, i) for q, i in zip(self._seqs, self._ids) if self.members.get(i) == q]
+            self._seqs = [q for q, _ in pairs]
+            self._ids = [i for _, i in pairs]
+
+    def page(self, after_seq: int, limit: int,
+             accept=None) -> Tuple[List[str], Optional[int]]:
+        """Up to limit IDs with seq > after_seq, plus the last seq returned"""
+        result: List[str] = []
+        last_seq: Optional[int] = None
+        position = bisect.bisect_right(self._seqs, after_seq)
+        while position < len(self._seqs) and len(result) < limit:
+            seq, device_id = self._seqs[position], self._ids[position]
+            position += 1
+            if self.members.get(device_id) != seq:
+                continue
+            if accept is not None and not accept(device_id):
+                continue
+            result.append(device_id)
+            last_seq = seq
+        return result, last_seq
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+def device_parent(device: Device) -> Optional[str]:
+    """Upstream device ID of a device, if known"""
+    return (getattr(device, "parent_device", None)
+            or getattr(device, "olt_id", None)
+            or device.config.get("parent"))
+
 class DeviceManager:
     """Manages all devices in the simulation"""
     
     def __init__(self):
         self.devices: Dict[str, Device] = {}
+        # Topology version, bumped on every change; used for ETags
+        self.version = 0
+        self._seq = itertools.count(1)
+        self._all = OrderedIndex()
+        self._by_type: Dict[str, OrderedIndex] = {}
+        self._by_parent: Dict[str, OrderedIndex] = {}
+        self._indexed: Dict[str, Tuple[int, str, Optional[str]]] = {}  # id -> (seq, type, parent)
+        self._listeners: List[Callable[[str, Optional[str], Optional[Device]], None]] = []
+
+    def add_listener(self, callback: Callable[[str, Optional[str], Optional[Device]], None]):
+        """Called as (action, device_id, device) on add/update/remove/reset"""
+        self._listeners.append(callback)
+
+    def _notify(self, action: str, device_id: Optional[str] = None, device: Optional[Device] = None):
+        for callback in self._listeners:
+            callback(action, device_id, device)
+
+    def _index(self, device: Device, seq: Optional[int] = None):
+        seq = seq if seq is not None else next(self._seq)
+        parent = device_parent(device)
+        self._all.add(device.id, seq)
+        self._by_type.setdefault(device.type, OrderedIndex()).add(device.id, seq)
+        if parent:
+            self._by_parent.setdefault(parent, OrderedIndex()).add(device.id, seq)
+        self._indexed[device.id] = (seq, device.type, parent)
+
+    def _unindex(self, device_id: str) -> Optional[int]:
+        entry = self._indexed.pop(device_id, None)
+        if entry is None:
+            return None
+        seq, device_type, parent = entry
+        self._all.remove(device_id)
+        self._by_type[device_type].remove(device_id)
+        if parent:
+            self._by_parent[parent].remove(device_id)
+        return seq
+
+    def touch(self):
+        """Mark the topology as changed"""
+        self.version += 1
         
     def add_device(self, device: Device) -> Device:
         """Add a device to the topology"""
+        seq = self._unindex(device.id)
         self.devices[device.id] = device
+        self._index(device, seq)
+        self.touch()
+        self._notify("add", device.id, device)
         return device
         
     def get_device(self, device_id: str) -> Optional[Device]:
@@ -98,15 +207,47 @@ class DeviceManager:
         """Remove device from topology"""
         if device_id in self.devices:
             del self.devices[device_id]
+            self._unindex(device_id)
+            self.touch()
+            self._notify("remove", device_id)
             return True
         return False
         
     def list_devices(self, device_type: Optional[str] = None) -> List[Device]:
         """List all devices, optionally filtered by type"""
-        devices = list(self.devices.values())
         if device_type:
-            devices = [d for d in devices if d.type == device_type]
-        return devices
+            index = self._by_type.get(device_type)
+            return [self.devices[d] for d in index.members] if index else []
+        return list(self.devices.values())
+
+    def page_devices(self, after_seq: int = 0, limit: int = 100,
+                     device_type: Optional[str] = None,
+                     parent: Optional[str] = None) -> Tuple[List[Device], Optional[int], int]:
+        """Page through devices in insertion order using the type/parent indexes
+
+        Returns (devices, seq of the last device or None at the end, total matching).
+        """
+        indexes = []
+        if device_type is not None:
+            indexes.append(self._by_type.get(device_type) or OrderedIndex())
+        if parent is not None:
+            indexes.append(self._by_parent.get(parent) or OrderedIndex())
+        if not indexes:
+            indexes.append(self._all)
+        # Walk the smallest index and check membership in the others
+        indexes.sort(key=len)
+        primary, others = indexes[0], indexes[1:]
+        accept = (lambda d: all(d in other.members for other in others)) if others else None
+
+        ids, last_seq = primary.page(after_seq, limit + 1, accept)
+        has_more = len(ids) > limit
+        ids = ids[:limit]
+        if others:
+            total = sum(1 for d in primary.members if accept(d))
+        else:
+            total = len(primary)
+        next_seq = self._indexed[ids[-1]][0] if has_more and ids else None
+        return [self.devices[d] for d in ids], next_seq, total
         
     def update_device(self, device_id: str, **kwargs) -> Optional[Device]:
         """Update device configuration"""
@@ -116,11 +257,22 @@ class DeviceManager:
                 if hasattr(device, key):
                     setattr(device, key, value)
             device.updated_at = datetime.now()
+            entry = self._indexed.get(device_id)
+            if entry and (entry[1] != device.type or entry[2] != device_parent(device)):
+                self._index(device, self._unindex(device_id))
+            self.touch()
+            self._notify("update", device_id, device)
         return device
         
     def reset(self):
         """Reset all devices"""
         self.devices.clear()
+        self._all = OrderedIndex()
+        self._by_type.clear()
+        self._by_parent.clear()
+        self._indexed.clear()
+        self.touch()
+        self._notify("reset")
 
 def generate_device_id(device_type: str) -> str:
     """Generate unique device ID"""
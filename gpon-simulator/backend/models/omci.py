@@ -0,0 +1,324 @@
+"""
+OMCI MIB model
+Per-ONT managed-entity (ME) database with MIB data sync counter, MIB upload
+and an OLT-side audit that only re-uploads ME classes whose hashes diverge.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from pydantic import BaseModel, Field
+from datetime import datetime
+import copy
+import hashlib
+import json
+
+from models.scheduler import checkpoint
+
+# ME class ids (ITU-T G.988)
+ME_SOFTWARE_IMAGE = 7
+ME_PPTP_ETHERNET_UNI = 11
+ME_MAC_BRIDGE_SERVICE_PROFILE = 45
+ME_MAC_BRIDGE_PORT_CONFIG = 47
+ME_VLAN_TAGGING_FILTER = 84
+ME_ONT_G = 256
+ME_ONT2_G = 257
+ME_TCONT = 262
+ME_ANI_G = 263
+ME_GEM_PORT_CTP = 268
+
+ME_CLASS_NAMES = {
+    ME_SOFTWARE_IMAGE: "Software image",
+    ME_PPTP_ETHERNET_UNI: "PPTP Ethernet UNI",
+    ME_MAC_BRIDGE_SERVICE_PROFILE: "MAC bridge service profile",
+    ME_MAC_BRIDGE_PORT_CONFIG: "MAC bridge port configuration data",
+    ME_VLAN_TAGGING_FILTER: "VLAN tagging filter data",
+    ME_ONT_G: "ONT-G",
+    ME_ONT2_G: "ONT2-G",
+    ME_TCONT: "T-CONT",
+    ME_ANI_G: "ANI-G",
+    ME_GEM_PORT_CTP: "GEM port network CTP",
+}
+
+DEFAULT_VLAN = 100
+
+def _entity_hash(class_id: int, instance_id: int, attributes: Dict[str, Any]) -> int:
+    """Stable 64-bit hash of one ME instance"""
+    payload = json.dumps([class_id, instance_id, attributes], sort_keys=True, default=str)
+    return int.from_bytes(hashlib.blake2b(payload.encode(), digest_size=8).digest(), "big")
+
+class OntMib:
+    """Managed-entity database of one ONT (or the OLT's copy of it)
+
+    Entities are stored as class_id -> instance_id -> attributes. Each class
+    keeps an XOR-combined hash of its instances, updated incrementally on
+    every mutation, so comparing two MIBs costs O(number of classes).
+    """
+
+    def __init__(self, ont_id: str):
+        self.ont_id = ont_id
+        self.entities: Dict[int, Dict[int, Dict[str, Any]]] = {}
+        self.class_hashes: Dict[int, int] = {}
+        self.mib_data_sync = 0
+        self.uploads = 0
+
+    def _bump_sync(self):
+        # 8-bit counter, 0 is reserved for "MIB reset"
+        self.mib_data_sync = self.mib_data_sync % 255 + 1
+
+    def _rehash(self, class_id: int, instance_id: int,
+                old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]):
+        value = self.class_hashes.get(class_id, 0)
+        if old is not None:
+            value ^= _entity_hash(class_id, instance_id, old)
+        if new is not None:
+            value ^= _entity_hash(class_id, instance_id, new)
+        if value or self.entities.get(class_id):
+            self.class_hashes[class_id] = value
+        else:
+            self.class_hashes.pop(class_id, None)
+
+    def get(self, class_id: int, instance_id: int) -> Optional[Dict[str, Any]]:
+        """Get ME attributes"""
+        return self.entities.get(class_id, {}).get(instance_id)
+
+    def create(self, class_id: int, instance_id: int, attributes: Dict[str, Any]):
+        """Create an ME instance"""
+        instances = self.entities.setdefault(class_id, {})
+        old = instances.get(instance_id)
+        instances[instance_id] = copy.deepcopy(attributes)
+        self._rehash(class_id, instance_id, old, instances[instance_id])
+        self._bump_sync()
+
+    def set(self, class_id: int, instance_id: int, attributes: Dict[str, Any]) -> bool:
+        """Set attributes on an existing ME instance"""
+        current = self.get(class_id, instance_id)
+        if current is None:
+            return False
+        updated = {**current, **copy.deepcopy(attributes)}
+        self.entities[class_id][instance_id] = updated
+        self._rehash(class_id, instance_id, current, updated)
+        self._bump_sync()
+        return True
+
+    def delete(self, class_id: int, instance_id: int) -> bool:
+        """Delete an ME instance"""
+        instances = self.entities.get(class_id)
+        if not instances or instance_id not in instances:
+            return False
+        old = instances.pop(instance_id)
+        if not instances:
+            del self.entities[class_id]
+        self._rehash(class_id, instance_id, old, None)
+        self._bump_sync()
+        return True
+
+    def upload(self, classes: Optional[Iterable[int]] = None) -> Dict[int, Dict[int, Dict[str, Any]]]:
+        """MIB upload, optionally limited to some ME classes"""
+        self.uploads += 1
+        wanted = self.entities.keys() if classes is None else classes
+        return {
+            class_id: copy.deepcopy(self.entities[class_id])
+            for class_id in wanted if class_id in self.entities
+        }
+
+    def load(self, snapshot: Dict[int, Dict[int, Dict[str, Any]]],
+             classes: Optional[Iterable[int]] = None, mib_data_sync: Optional[int] = None):
+        """Replace classes from an uploaded snapshot without touching the counter"""
+        for class_id in (list(snapshot) if classes is None else classes):
+            for instance_id, attributes in self.entities.pop(class_id, {}).items():
+                self._rehash(class_id, instance_id, attributes, None)
+            for instance_id, attributes in snapshot.get(class_id, {}).items():
+                self.entities.setdefault(class_id, {})[instance_id] = copy.deepcopy(attributes)
+                self._rehash(class_id, instance_id, None, attributes)
+        if mib_data_sync is not None:
+            self.mib_data_sync = mib_data_sync
+
+    def entity_count(self) -> int:
+        return sum(len(instances) for instances in self.entities.values())
+
+    def to_dict(self) -> Dict:
+        """Serializable view"""
+        return {
+            "ont_id": self.ont_id,
+            "mib_data_sync": self.mib_data_sync,
+            "entity_count": self.entity_count(),
+            "classes": {
+                str(class_id): {
+                    "name": ME_CLASS_NAMES.get(class_id, f"ME {class_id}"),
+                    "hash": f"{self.class_hashes.get(class_id, 0):016x}",
+                    "instances": {str(i): attrs for i, attrs in instances.items()},
+                }
+                for class_id, instances in sorted(self.entities.items())
+            },
+        }
+
+def build_default_mib(ont) -> OntMib:
+    """Initial MIB as provisioned for an ONT device"""
+    mib = OntMib(ont.id)
+    mib.create(ME_ONT_G, 0, {
+        "vendor_id": ont.serial_number[:4],
+        "serial_number": ont.serial_number,
+        "admin_state": 0,
+    })
+    mib.create(ME_ONT2_G, 0, {"equipment_id": ont.model or "ONT", "omcc_version": 0xA0})
+    mib.create(ME_SOFTWARE_IMAGE, 0, {"version": ont.firmware_version, "is_committed": 1, "is_active": 1})
+    mib.create(ME_ANI_G, 0x8001, {"optical_signal_level": ont.rx_level_dbm, "tx_optical_level": ont.tx_level_dbm})
+    mib.create(ME_TCONT, 0x8001, {"alloc_id": 1024})
+    mib.create(ME_MAC_BRIDGE_SERVICE_PROFILE, 1, {"learning": 1, "port_bridging": 0})
+    for port in range(1, ont.cpe_ports + 1):
+        mib.create(ME_PPTP_ETHERNET_UNI, 0x100 + port, {"admin_state": 0, "auto_detection": 0})
+        mib.create(ME_GEM_PORT_CTP, port, {"port_id": 1000 + port, "tcont_pointer": 0x8001})
+        mib.create(ME_MAC_BRIDGE_PORT_CONFIG, port, {"bridge_id": 1, "tp_type": 1, "tp_pointer": 0x100 + port})
+        mib.create(ME_VLAN_TAGGING_FILTER, port, {
+            "vlan_filter_list": [DEFAULT_VLAN],
+            "forward_operation": 0x10,
+            "number_of_entries": 1,
+        })
+    return mib
+
+class MibAuditResult(BaseModel):
+    """Outcome of auditing one ONT"""
+    ont_id: str
+    in_sync: bool
+    olt_mib_data_sync: int
+    ont_mib_data_sync: int
+    divergent_classes: List[int] = []
+    changes: List[Dict[str, Any]] = []
+    entities_uploaded: int = 0
+    repaired: bool = False
+    timestamp: datetime = Field(default_factory=datetime.now)
+
+class OMCIMibManager:
+    """ONT MIBs plus the OLT's expected copy of each, with audit"""
+
+    def __init__(self):
+        self.ont_mibs: Dict[str, OntMib] = {}
+        self.olt_mibs: Dict[str, OntMib] = {}
+
+    def ensure(self, ont) -> Tuple[OntMib, OntMib]:
+        """Get (ONT MIB, OLT copy), provisioning both on first use"""
+        mib = self.ont_mibs.get(ont.id)
+        if mib is None:
+            mib = build_default_mib(ont)
+            mirror = OntMib(ont.id)
+            mirror.load(mib.upload(), mib_data_sync=mib.mib_data_sync)
+            self.ont_mibs[ont.id] = mib
+            self.olt_mibs[ont.id] = mirror
+        return mib, self.olt_mibs[ont.id]
+
+    def apply(self, ont, operation: str, class_id: int, instance_id: int,
+              attributes: Optional[Dict[str, Any]] = None, via_olt: bool = True) -> bool:
+        """Apply a create/set/delete to the ONT MIB
+
+        Changes made through the OLT are mirrored on the OLT copy; anything
+        else (rogue OMCI, local console) only changes the ONT and will show
+        up as divergence on the next audit.
+        """
+        mib, mirror = self.ensure(ont)
+        targets = [mib, mirror] if via_olt else [mib]
+        result = False
+        for target in targets:
+            if operation == "create":
+                target.create(class_id, instance_id, attributes or {})
+                result = True
+            elif operation == "set":
+                result = target.set(class_id, instance_id, attributes or {})
+            elif operation == "delete":
+                result = target.delete(class_id, instance_id)
+            else:
+                raise ValueError(f"Unknown OMCI operation {operation}")
+        return result
+
+    def audit(self, ont_id: str, repair: bool = False) -> Optional[MibAuditResult]:
+        """Compare OLT copy with the ONT, uploading only divergent ME classes"""
+        mib = self.ont_mibs.get(ont_id)
+        mirror = self.olt_mibs.get(ont_id)
+        if mib is None or mirror is None:
+            return None
+
+        result = MibAuditResult(
+            ont_id=ont_id,
+            in_sync=True,
+            olt_mib_data_sync=mirror.mib_data_sync,
+            ont_mib_data_sync=mib.mib_data_sync,
+        )
+        # Fast path: matching MIB data sync counters
+        if mib.mib_data_sync == mirror.mib_data_sync:
+            return result
+
+        classes = mib.class_hashes.keys() | mirror.class_hashes.keys()
+        divergent = sorted(
+            class_id for class_id in classes
+            if mib.class_hashes.get(class_id) != mirror.class_hashes.get(class_id)
+        )
+        result.divergent_classes = divergent
+        result.in_sync = not divergent
+
+        uploaded = mib.upload(divergent) if divergent else {}
+        result.entities_uploaded = sum(len(instances) for instances in uploaded.values())
+        for class_id in divergent:
+            expected = mirror.entities.get(class_id, {})
+            actual = uploaded.get(class_id, {})
+            for instance_id in sorted(expected.keys() | actual.keys()):
+                if expected.get(instance_id) != actual.get(instance_id):
+                    result.changes.append({
+                        "class_id": class_id,
+                        "class_name": ME_CLASS_NAMES.get(class_id, f"ME {class_id}"),
+                        "instance_id": instance_id,
+                        "expected": expected.get(instance_id),
+                        "actual": actual.get(instance_id),
+                    })
+
+        if repair and divergent:
+            # Push the OLT's view back to the ONT for the divergent classes
+            mib.load(mirror.upload(divergent), classes=divergent)
+            result.repaired = True
+        # Realign counters only once the MIBs really match (benign drift or
+        # repaired); unrepaired divergence must keep failing the fast path
+        if result.in_sync or result.repaired:
+            mirror.mib_data_sync = mib.mib_data_sync
+        return result
+
+    def audit_all(self, ont_ids: Optional[Iterable[str]] = None, repair: bool = False) -> Dict:
+        """Audit many ONTs, reporting only those that diverge"""
+        ids = list(self.ont_mibs) if ont_ids is None else list(ont_ids)
+        report = self._new_report()
+        for ont_id in ids:
+            self._audit_into(report, ont_id, repair)
+        return report
+
+    async def audit_all_async(self, ont_ids: Optional[Iterable[str]] = None,
+                              repair: bool = False) -> Dict:
+        """audit_all on the event loop, yielding between ONTs
+
+        Audits read and repair both MIB copies, so they run on the same
+        thread as the OMCI commands that mutate them; time slicing keeps
+        the loop responsive instead.
+        """
+        ids = list(self.ont_mibs) if ont_ids is None else list(ont_ids)
+        report = self._new_report()
+        for ont_id in ids:
+            self._audit_into(report, ont_id, repair)
+            await checkpoint()
+        return report
+
+    @staticmethod
+    def _new_report() -> Dict:
+        return {"audited": 0, "divergent": [], "entities_uploaded": 0, "entities_full_upload": 0}
+
+    def _audit_into(self, report: Dict, ont_id: str, repair: bool):
+        result = self.audit(ont_id, repair=repair)
+        if result is None:
+            return
+        report["audited"] += 1
+        report["entities_uploaded"] += result.entities_uploaded
+        report["entities_full_upload"] += self.ont_mibs[ont_id].entity_count()
+        if not result.in_sync:
+            report["divergent"].append(result)
+
+    def remove(self, ont_id: str):
+        """Drop MIBs of a removed ONT"""
+        self.ont_mibs.pop(ont_id, None)
+        self.olt_mibs.pop(ont_id, None)
+
+    def reset(self):
+        self.ont_mibs.clear()
+        self.olt_mibs.clear()
@@ -2,13 +2,18 @@
 Protocol simulation module
 Simulates OMCI, DHCP, ARP, IGMP, etc.
 """
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Callable
 from pydantic import BaseModel, Field
 from datetime import datetime, timedelta
 import random
 import asyncio
+import time
 from collections import defaultdict
 
+from models.omci import OMCIMibManager, ME_VLAN_TAGGING_FILTER, ME_SOFTWARE_IMAGE
+from models.arp import ArpEngine
+from models.activation import ActivationEngine
+
 class OMCICommand(BaseModel):
     """OMCI command structure"""
     device_id: str
@@ -32,13 +37,59 @@ class ProtocolSimulator:
         self.omci_logs: List[Dict] = []
         self.dhcp_pool: Dict[str, str] = {}  # MAC -> IP
         self.dhcp_leases: Dict[str, DHCPLease] = {}
-        self.arp_table: Dict[str, str] = {}  # IP -> MAC
+        self.arp = ArpEngine()
+        self.gateway_id = "gateway"  # ARP cache of the DHCP server / default gateway
         self.dhcp_server_ip = "192.168.1.1"
         self.dhcp_server_range = 50  # 192.168.1.2 - 192.168.1.51
         self.dhcp_lease_time = 3600  # 1 hour
+        self._leased_ips: set = set()
+        self.omci_mib = OMCIMibManager()
+        self.activation = ActivationEngine(device_manager, self.omci_mib)
+        self._event_listeners: List[Callable[[Dict], Any]] = []
+        self.arp.add_listener(self._on_arp_change)
+        device_manager.add_listener(self._on_device_change)
+
+    def _on_device_change(self, action: str, device_id: Optional[str], device):
+        # Drop MIBs of removed ONTs so audits stop visiting them
+        if action == "remove":
+            self.omci_mib.remove(device_id)
+        elif action == "reset":
+            self.omci_mib.reset()
+
+    @property
+    def arp_table(self) -> Dict[str, str]:
+        """Gateway's view of IP -> MAC"""
+        return self.arp.cache(self.gateway_id).entries(time.time())
+
+    def add_event_listener(self, callback: Callable[[Dict], Any]):
+        """Subscribe to protocol events (dicts with 'type' and 'ts')"""
+        self._event_listeners.append(callback)
+
+    def _emit(self, event_type: str, **fields):
+        """Publish a protocol event to listeners"""
+        if not self._event_listeners:
+            return
+        event = {"type": event_type, "ts": time.time(), **fields}
+        for callback in self._event_listeners:
+            callback(event)
+
+    def _on_arp_change(self, ip_address: str, mac_address: str, previous: Optional[str],
+                       source: str, count: int):
+        """Publish IP ownership changes from the ARP journal"""
+        self._emit("arp_update", ip=ip_address, mac=mac_address,
+                   previous_mac=previous, source=source, count=count)
+
+    def _arp_update(self, ip_address: str, mac_address: str, source: str):
+        """Gateway learns an ARP entry"""
+        self.arp.learn(self.gateway_id, ip_address, mac_address, source=source)
         
-    async def send_omci_command(self, ont_id: str, command_type: str, params: Dict[str, Any]) -> Dict:
-        """Send OMCI command to ONT"""
+    async def send_omci_command(self, ont_id: str, command_type: str, params: Dict[str, Any],
+                                via_olt: bool = True) -> Dict:
+        """Send OMCI command to ONT
+
+        Commands sent via the OLT are mirrored in the OLT's copy of the MIB;
+        via_olt=False models a rogue OMCI source that only changes the ONT.
+        """
         ont = self.device_manager.get_device(ont_id)
         if not ont or ont.type != "ONT":
             return {"success": False, "error": "ONT not found"}
@@ -47,7 +98,8 @@ class ProtocolSimulator:
             "timestamp": datetime.now().isoformat(),
             "ont_id": ont_id,
             "command": command_type,
-            "parameters": params
+            "parameters": params,
+            "via_olt": via_olt
         }
         
         # Simulate OMCI command execution
@@ -59,7 +111,9 @@ class ProtocolSimulator:
             success_prob = 0.8
             
         elif command_type == "reboot":
-            ont.status = "offline"
+            # The ONT goes offline and re-registers through the activation engine
+            report = self.activation.reboot_ont(ont)
+            log_entry["recovery_id"] = report.report_id
             success_prob = 0.95
             
         elif command_type == "firmware_update":
@@ -68,26 +122,77 @@ class ProtocolSimulator:
             
         success = random.random() < success_prob
         log_entry["success"] = success
+
+        if success:
+            self._apply_omci_to_mib(ont, command_type, params, via_olt)
+            log_entry["mib_data_sync"] = self.omci_mib.ont_mibs[ont_id].mib_data_sync
         
         self.omci_logs.append(log_entry)
+        self._emit("omci_command", ont_id=ont_id, command=command_type, success=success,
+                   parameters=params, via_olt=via_olt)
         
         return {"success": success, "log": log_entry}
         
-    async def dhcp_discover(self, client_mac: str, client_hostname: Optional[str] = None) -> Optional[str]:
-        """Handle DHCP discover request"""
+    def _apply_omci_to_mib(self, ont, command_type: str, params: Dict[str, Any], via_olt: bool):
+        """Translate a high-level OMCI command into ME operations"""
+        mib, _ = self.omci_mib.ensure(ont)
+        if command_type == "set_vlan":
+            ports = [params["port"]] if "port" in params else list(mib.entities.get(ME_VLAN_TAGGING_FILTER, {}))
+            for port in ports:
+                self.omci_mib.apply(ont, "set", ME_VLAN_TAGGING_FILTER, port, {
+                    "vlan_filter_list": [params.get("vlan")],
+                    "number_of_entries": 1,
+                }, via_olt=via_olt)
+        elif command_type == "firmware_update":
+            self.omci_mib.apply(ont, "set", ME_SOFTWARE_IMAGE, 0, {
+                "version": params.get("version"),
+                "is_committed": 0,
+            }, via_olt=via_olt)
+            
+    async def audit_omci_mibs(self, ont_ids: Optional[List[str]] = None, repair: bool = False) -> Dict:
+        """Run OLT-side MIB audit and publish divergences"""
+        report = await self.omci_mib.audit_all_async(ont_ids, repair=repair)
+        self.publish_omci_audit(report)
+        return report
+
+    def publish_omci_audit(self, report: Dict):
+        """Publish divergences found by an audit"""
+        for result in report["divergent"]:
+            self._emit("omci_mib_divergence", ont_id=result.ont_id,
+                       classes=result.divergent_classes, repaired=result.repaired)
+
+    async def dhcp_discover(self, client_mac: str, client_hostname: Optional[str] = None,
+                            source_mac: Optional[str] = None) -> Optional[str]:
+        """Handle DHCP discover request
+
+        client_mac is the CHADDR field, source_mac the Ethernet source
+        (differs when an attacker spoofs CHADDR during starvation).
+        """
+        source_mac = source_mac or client_mac
+
+        # Existing client renews its lease
+        if client_mac in self.dhcp_pool:
+            ip = self.dhcp_pool[client_mac]
+            self._emit("dhcp_discover", server=self.dhcp_server_ip, mac=client_mac,
+                       source_mac=source_mac, ip=ip, renewed=True)
+            return ip
+
         # Check if we have a free IP
         available_ip = None
         for i in range(2, 2 + self.dhcp_server_range):
             ip = f"192.168.1.{i}"
-            if ip not in self.dhcp_pool:
+            if ip not in self._leased_ips:
                 available_ip = ip
                 break
                 
         if not available_ip:
+            self._emit("dhcp_discover", server=self.dhcp_server_ip, mac=client_mac,
+                       source_mac=source_mac, ip=None)
             return None  # DHCP starvation - no free IPs
             
         # Grant lease
         self.dhcp_pool[client_mac] = available_ip
+        self._leased_ips.add(available_ip)
         
         lease = DHCPLease(
             mac_address=client_mac,
@@ -96,9 +201,11 @@ class ProtocolSimulator:
             expiry=datetime.now() + timedelta(seconds=self.dhcp_lease_time)
         )
         self.dhcp_leases[client_mac] = lease
+        self._emit("dhcp_discover", server=self.dhcp_server_ip, mac=client_mac,
+                   source_mac=source_mac, ip=available_ip)
         
         # Update ARP
-        self.arp_table[available_ip] = client_mac
+        self._arp_update(available_ip, client_mac, source="dhcp")
         
         return available_ip
         
@@ -107,8 +214,17 @@ class ProtocolSimulator:
         if client_mac in self.dhcp_pool:
             ip = self.dhcp_pool[client_mac]
             del self.dhcp_pool[client_mac]
-            if ip in self.arp_table:
-                del self.arp_table[ip]
+            self.dhcp_leases.pop(client_mac, None)
+            self._leased_ips.discard(ip)
+            self.arp.forget(ip)
+            self._emit("dhcp_release", mac=client_mac, ip=ip)
+
+    def restore_lease(self, lease: DHCPLease):
+        """Re-install a lease loaded from persistent storage"""
+        self.dhcp_pool[lease.mac_address] = lease.ip_address
+        self.dhcp_leases[lease.mac_address] = lease
+        self._leased_ips.add(lease.ip_address)
+        self.arp.learn(self.gateway_id, lease.ip_address, lease.mac_address, source="dhcp")
                 
     def get_dhcp_stats(self) -> Dict:
         """Get DHCP statistics"""
@@ -123,13 +239,26 @@ class ProtocolSimulator:
             "utilization_percent": (used / total) * 100
         }
         
-    async def arp_resolve(self, ip_address: str) -> Optional[str]:
-        """Resolve IP to MAC"""
-        return self.arp_table.get(ip_address)
+    async def arp_resolve(self, ip_address: str, device_id: Optional[str] = None) -> Optional[str]:
+        """Resolve IP to MAC from a device's cache (the gateway by default)"""
+        return self.arp.resolve(device_id or self.gateway_id, ip_address)
         
-    async def arp_spoof(self, ip_address: str, spoofed_mac: str):
-        """Perform ARP spoofing"""
-        self.arp_table[ip_address] = spoofed_mac
+    async def arp_spoof(self, ip_address: str, spoofed_mac: str, sender_id: Optional[str] = None):
+        """Perform ARP spoofing with a single gratuitous ARP"""
+        self.arp.submit_gratuitous(ip_address, spoofed_mac, sender_id)
+        await self.flush_arp()
+
+    def gratuitous_arp(self, ip_address: str, mac_address: str, sender_id: Optional[str] = None):
+        """Queue a gratuitous ARP for batched processing"""
+        self.arp.submit_gratuitous(ip_address, mac_address, sender_id)
+
+    async def flush_arp(self, batch_size: int = 1024) -> int:
+        """Process queued gratuitous ARPs in batches, yielding between them"""
+        processed = 0
+        while self.arp.pending:
+            processed += self.arp.process_batch(batch_size, extra_receivers=(self.gateway_id,))
+            await asyncio.sleep(0)
+        return processed
         
     def get_omci_logs(self, ont_id: Optional[str] = None, limit: int = 100) -> List[Dict]:
         """Get OMCI logs, optionally filtered by ONT"""
@@ -143,7 +272,8 @@ class ProtocolSimulator:
         return {
             "dhcp": self.get_dhcp_stats(),
             "omci_commands_total": len(self.omci_logs),
-            "arp_entries": len(self.arp_table),
+            "arp_entries": len(self.arp.cache(self.gateway_id)),
+            "arp": self.arp.stats(),
             "active_leases": len(self.dhcp_leases)
         }
         
@@ -152,5 +282,8 @@ class ProtocolSimulator:
         self.omci_logs.clear()
         self.dhcp_pool.clear()
         self.dhcp_leases.clear()
-        self.arp_table.clear()
+        self._leased_ips.clear()
+        self.arp.reset()
+        self.omci_mib.reset()
+        self.activation.reset()
 
@@ -6,6 +6,9 @@ from pydantic import BaseModel, Field
 from datetime import datetime
 import asyncio
 import json
+import uuid
+
+from models.scheduler import ScenarioScheduler, checkpoint
 
 class ScenarioStep(BaseModel):
     """Single step in an attack scenario"""
@@ -26,21 +29,32 @@ class AttackScenario(BaseModel):
     
 class RunningScenario(BaseModel):
     """Currently running scenario"""
+    run_id: str = Field(default_factory=lambda: f"run-{uuid.uuid4().hex[:8]}")
     scenario: AttackScenario
-    start_time: datetime = Field(default_factory=datetime.now)
+    priority: int = 0
+    status: str = "queued"  # queued, running, completed, cancelled, failed
+    submitted_time: datetime = Field(default_factory=datetime.now)
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
     current_step: int = 0
     completed: bool = False
+    error: Optional[str] = None
     results: List[Dict] = []
 
 class ScenarioRunner:
     """Manages and executes attack scenarios"""
     
-    def __init__(self, device_manager, protocol_simulator):
+    def __init__(self, device_manager, protocol_simulator, max_concurrent: int = 10,
+                 history_size: int = 200):
         self.device_manager = device_manager
         self.protocol_simulator = protocol_simulator
         self.available_scenarios: Dict[str, AttackScenario] = {}
-        self.active_scenarios: Dict[str, RunningScenario] = {}
+        self.active_scenarios: Dict[str, RunningScenario] = {}  # run_id -> run
+        self.finished_scenarios: Dict[str, RunningScenario] = {}
+        self.history_size = history_size
+        self.scheduler = ScenarioScheduler(max_concurrent=max_concurrent)
         self._action_handlers: Dict[str, Callable] = {}
+        self._run_listeners: List[Callable[[RunningScenario], None]] = []
         self._init_handlers()
         self._load_default_scenarios()
         
@@ -51,7 +65,9 @@ class ScenarioRunner:
             "dhcp_starvation": self._dhcp_starvation,
             "dhcp_spoof": self._dhcp_spoof,
             "omci_modify": self._omci_modify,
+            "omci_audit": self._omci_audit,
             "arp_spoof": self._arp_spoof,
+            "arp_flood": self._arp_flood,
             "igmp_flood": self._igmp_flood,
             "ddos_uplink": self._ddos_uplink,
             "infect_botnet": self._infect_botnet,
@@ -81,8 +97,9 @@ class ScenarioRunner:
                 "steps": [
                     {"step_number": 1, "action": "omci_modify", "parameters": {"ont_id": "auto", "command": "set_vlan", "vlan": 999}, "delay_seconds": 0},
                     {"step_number": 2, "action": "omci_modify", "parameters": {"ont_id": "auto", "command": "reboot"}, "delay_seconds": 3},
+                    {"step_number": 3, "action": "omci_audit", "parameters": {"repair": False}, "delay_seconds": 2},
                 ],
-                "expected_outcome": ["ont_lost_connectivity", "traffic_moved_to_vlan_999"],
+                "expected_outcome": ["ont_lost_connectivity", "traffic_moved_to_vlan_999", "mib_divergence_detected"],
                 "observability": {"logs": ["omci", "ssh"], "metrics": ["ont_status", "vlan_changes"]}
             },
             {
@@ -97,34 +114,87 @@ class ScenarioRunner:
                 "expected_outcome": ["traffic_intercepted", "mitm_established"],
                 "observability": {"logs": ["arp"], "metrics": ["arp_table_changes"]}
             },
+            {
+                "id": "arp_flood_001",
+                "name": "Gratuitous ARP Flood",
+                "description": "Botnet floods gratuitous ARP claiming the gateway and neighbor addresses",
+                "category": "arp",
+                "steps": [
+                    {"step_number": 1, "action": "compromise_cpe", "parameters": {"count": 30}, "delay_seconds": 0},
+                    {"step_number": 2, "action": "arp_flood", "parameters": {"target_ips": ["192.168.1.1"], "rounds": 100}, "delay_seconds": 2},
+                ],
+                "expected_outcome": ["arp_tables_poisoned", "arp_conflicts_detected"],
+                "observability": {"logs": ["arp"], "metrics": ["arp_table_changes", "arp_conflicts"]}
+            },
         ]
         
         for scenario_data in scenarios:
             scenario = AttackScenario(**scenario_data)
             self.available_scenarios[scenario.id] = scenario
             
-    async def run_scenario(self, scenario_id: str) -> RunningScenario:
-        """Run an attack scenario"""
+    async def run_scenario(self, scenario_id: str, priority: int = 0) -> RunningScenario:
+        """Queue an attack scenario run"""
         scenario = self.available_scenarios.get(scenario_id)
         if not scenario:
             raise ValueError(f"Scenario {scenario_id} not found")
             
-        running = RunningScenario(
-            scenario=scenario,
-            start_time=datetime.now(),
-            current_step=0
-        )
-        
-        self.active_scenarios[scenario_id] = running
+        running = RunningScenario(scenario=scenario, priority=priority)
+        self.active_scenarios[running.run_id] = running
         
-        # Execute scenario asynchronously
-        asyncio.create_task(self._execute_scenario(running))
+        # Execute scenario asynchronously once the scheduler has a free slot
+        self.scheduler.submit(
+            running.run_id,
+            lambda: self._execute_scenario(running),
+            priority=priority,
+            on_done=self._on_run_done
+        )
         
         return running
+
+    def stop_scenario(self, run_id: str) -> bool:
+        """Cancel a queued or running scenario"""
+        if run_id not in self.active_scenarios:
+            return False
+        return self.scheduler.cancel(run_id)
+
+    def get_run(self, run_id: str) -> Optional[RunningScenario]:
+        """Get a run by ID, active or finished"""
+        return self.active_scenarios.get(run_id) or self.finished_scenarios.get(run_id)
+
+    def get_runs(self, scenario_id: Optional[str] = None) -> List[RunningScenario]:
+        """Get active and recently finished runs"""
+        runs = list(self.active_scenarios.values()) + list(self.finished_scenarios.values())
+        if scenario_id:
+            runs = [run for run in runs if run.scenario.id == scenario_id]
+        return runs
+
+    def add_run_listener(self, callback: Callable[[RunningScenario], None]):
+        """Called with each run once it has finished"""
+        self._run_listeners.append(callback)
+
+    def _on_run_done(self, run_id: str, error: Optional[BaseException]):
+        running = self.active_scenarios.pop(run_id, None)
+        if running is None:
+            return
+        running.end_time = datetime.now()
+        if isinstance(error, asyncio.CancelledError):
+            running.status = "cancelled"
+        elif error is not None:
+            running.status = "failed"
+            running.error = str(error)
+        else:
+            running.status = "completed"
+        self.finished_scenarios[run_id] = running
+        while len(self.finished_scenarios) > self.history_size:
+            self.finished_scenarios.pop(next(iter(self.finished_scenarios)))
+        for callback in self._run_listeners:
+            callback(running)
         
     async def _execute_scenario(self, running: RunningScenario):
         """Execute scenario steps"""
         scenario = running.scenario
+        running.status = "running"
+        running.start_time = datetime.now()
         
         for step in scenario.steps:
             running.current_step = step.step_number
@@ -143,6 +213,7 @@ class ScenarioRunner:
                     "result": result,
                     "timestamp": datetime.now().isoformat()
                 })
+            await checkpoint()
                 
         running.completed = True
         
@@ -154,8 +225,9 @@ class ScenarioRunner:
         
         compromised = []
         for device in devices[:count]:
-            device.infected = True
+            self.device_manager.update_device(device.id, infected=True)
             compromised.append(device.id)
+            await checkpoint()
             
         return {"success": True, "compromised": compromised, "count": len(compromised)}
         
@@ -167,10 +239,12 @@ class ScenarioRunner:
         requests = 0
         for device in devices:
             if device.infected:
-                # Generate many DHCP requests
-                for _ in range(100):
-                    await self.protocol_simulator.dhcp_discover(device.mac_address)
+                # Generate many DHCP requests with spoofed CHADDR
+                for i in range(100):
+                    spoofed_mac = f"02:{i:02x}:" + device.mac_address[6:]
+                    await self.protocol_simulator.dhcp_discover(spoofed_mac, source_mac=device.mac_address)
                     requests += 1
+                    await checkpoint()
                     
         return {"success": True, "requests_sent": requests, "duration": duration}
         
@@ -189,11 +263,29 @@ class ScenarioRunner:
                 ont_id = onts[0].id
                 
         command = params.get("command")
-        command_params = {k: v for k, v in params.items() if k not in ["ont_id", "command"]}
+        command_params = {k: v for k, v in params.items() if k not in ["ont_id", "command", "via_olt"]}
         
-        result = await self.protocol_simulator.send_omci_command(ont_id, command, command_params)
+        # Attacker-originated OMCI bypasses the OLT unless stated otherwise
+        result = await self.protocol_simulator.send_omci_command(
+            ont_id, command, command_params, via_olt=params.get("via_olt", False)
+        )
         return result
         
+    async def _omci_audit(self, params: Dict) -> Dict:
+        """Audit ONT MIBs against the OLT configuration"""
+        # Audits mutate the same MIBs as OMCI commands, so they stay on the
+        # loop and yield between ONTs rather than racing on a worker thread
+        report = await self.protocol_simulator.audit_omci_mibs(
+            params.get("ont_ids"), repair=params.get("repair", False)
+        )
+        return {
+            "success": True,
+            "audited": report["audited"],
+            "divergent_onts": [result.ont_id for result in report["divergent"]],
+            "entities_uploaded": report["entities_uploaded"],
+            "entities_full_upload": report["entities_full_upload"],
+        }
+        
     async def _arp_spoof(self, params: Dict) -> Dict:
         """Perform ARP spoofing"""
         target_ip = params.get("target_ip")
@@ -201,6 +293,31 @@ class ScenarioRunner:
         await self.protocol_simulator.arp_spoof(target_ip, attacker_mac)
         return {"success": True, "target_ip": target_ip, "spoofed_mac": attacker_mac}
         
+    async def _arp_flood(self, params: Dict) -> Dict:
+        """Gratuitous ARP flood from all infected clients"""
+        target_ips = params.get("target_ips", [self.protocol_simulator.dhcp_server_ip])
+        rounds = params.get("rounds", 10)
+        bots = [d for d in self.device_manager.list_devices("Client") if d.infected]
+
+        sent = 0
+        processed = 0
+        for _ in range(rounds):
+            for bot in bots:
+                for ip in target_ips:
+                    self.protocol_simulator.gratuitous_arp(ip, bot.mac_address, bot.id)
+                    sent += 1
+            # Drain each round so the queue stays bounded by one round of traffic
+            processed += await self.protocol_simulator.flush_arp()
+            await checkpoint()
+        return {
+            "success": True,
+            "bots": len(bots),
+            "sent": sent,
+            "processed": processed,
+            "dropped": self.protocol_simulator.arp.dropped,
+            "conflicts": len(self.protocol_simulator.arp.journal.conflicts(window_s=60))
+        }
+        
     async def _igmp_flood(self, params: Dict) -> Dict:
         """Perform IGMP flood"""
         # Implementation would flood IGMP messages
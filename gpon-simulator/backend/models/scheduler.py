@@ -0,0 +1,190 @@
+"""
+Scenario scheduling
+Priority queue with a global concurrency limit, cooperative cancellation,
+time-sliced yielding for long loops and event-loop lag tracking.
+"""
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from contextvars import ContextVar
+from collections import deque
+import asyncio
+import functools
+import heapq
+import itertools
+import time
+
+from models.stats import percentile
+
+class TimeSlice:
+    """Tracks how long the current run has held the event loop"""
+
+    def __init__(self, budget_s: float = 0.005):
+        self.budget_s = budget_s
+        self.started = time.perf_counter()
+        self.yields = 0
+
+    async def checkpoint(self):
+        """Yield to the event loop once the slice budget is used up"""
+        now = time.perf_counter()
+        if now - self.started >= self.budget_s:
+            await asyncio.sleep(0)
+            self.started = time.perf_counter()
+            self.yields += 1
+
+_current_slice: ContextVar[Optional[TimeSlice]] = ContextVar("scenario_time_slice", default=None)
+
+async def checkpoint():
+    """Cooperative yield point for long-running action loops
+
+    Cheap to call on every iteration: it only suspends when the running
+    scenario has used its time slice, which is also where a pending
+    cancellation gets delivered.
+    """
+    time_slice = _current_slice.get()
+    if time_slice is None:
+        time_slice = TimeSlice()
+        _current_slice.set(time_slice)
+    await time_slice.checkpoint()
+
+class LoopLagMonitor:
+    """Measures event-loop scheduling delay with a periodic timer"""
+
+    def __init__(self, interval_s: float = 0.1, history: int = 600):
+        self.interval_s = interval_s
+        self.samples: deque = deque(maxlen=history)
+        self.max_lag_s = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start sampling on the running loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            expected = time.perf_counter() + self.interval_s
+            await asyncio.sleep(self.interval_s)
+            lag = max(0.0, time.perf_counter() - expected)
+            self.samples.append(lag)
+            self.max_lag_s = max(self.max_lag_s, lag)
+
+    def stats(self) -> Dict[str, float]:
+        """Lag percentiles over the recent window, in milliseconds"""
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {"samples": 0, "p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0, "current_ms": 0.0}
+        return {
+            "samples": len(ordered),
+            "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+            "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+            "max_ms": round(self.max_lag_s * 1000, 3),
+            "current_ms": round(self.samples[-1] * 1000, 3),
+        }
+
+class ScenarioScheduler:
+    """Runs jobs by priority under a global concurrency limit"""
+
+    def __init__(self, max_concurrent: int = 10, slice_budget_s: float = 0.005):
+        self.max_concurrent = max_concurrent
+        self.slice_budget_s = slice_budget_s
+        self.lag_monitor = LoopLagMonitor()
+        self._queue: List[Tuple[int, int, str]] = []  # (-priority, seq, run_id)
+        self._pending: Dict[str, Callable[[], Awaitable[Any]]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._callbacks: Dict[str, Callable[[str, Optional[BaseException]], None]] = {}
+        self._seq = itertools.count()
+        self.completed = 0
+        self.cancelled = 0
+        self.failed = 0
+
+    def submit(self, run_id: str, job: Callable[[], Awaitable[Any]], priority: int = 0,
+               on_done: Optional[Callable[[str, Optional[BaseException]], None]] = None):
+        """Queue a job; higher priority starts first, FIFO within a priority"""
+        self._pending[run_id] = job
+        if on_done:
+            self._callbacks[run_id] = on_done
+        heapq.heappush(self._queue, (-priority, next(self._seq), run_id))
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._queue and len(self._tasks) < self.max_concurrent:
+            _, _, run_id = heapq.heappop(self._queue)
+            job = self._pending.pop(run_id, None)
+            if job is None:
+                continue  # cancelled while queued
+            task = asyncio.get_running_loop().create_task(self._run(job))
+            self._tasks[run_id] = task
+            task.add_done_callback(functools.partial(self._finished, run_id))
+
+    async def _run(self, job: Callable[[], Awaitable[Any]]):
+        _current_slice.set(TimeSlice(self.slice_budget_s))
+        await job()
+
+    def _finished(self, run_id: str, task: asyncio.Task):
+        """Done callback; also runs for tasks cancelled before their first step"""
+        error: Optional[BaseException] = None
+        if task.cancelled():
+            error = asyncio.CancelledError()
+            self.cancelled += 1
+        else:
+            error = task.exception()
+            if error is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+        self._tasks.pop(run_id, None)
+        callback = self._callbacks.pop(run_id, None)
+        if callback:
+            callback(run_id, error)
+        self._dispatch()
+
+    def cancel(self, run_id: str) -> bool:
+        """Cancel a queued or running job"""
+        if run_id in self._pending:
+            del self._pending[run_id]
+            self.cancelled += 1
+            callback = self._callbacks.pop(run_id, None)
+            if callback:
+                callback(run_id, asyncio.CancelledError())
+            return True
+        task = self._tasks.get(run_id)
+        if task and not task.done():
+            task.cancel()
+            return True
+        return False
+
+    def is_queued(self, run_id: str) -> bool:
+        return run_id in self._pending
+
+    def is_running(self, run_id: str) -> bool:
+        return run_id in self._tasks
+
+    async def shutdown(self):
+        """Cancel everything and stop background work"""
+        for run_id in list(self._pending):
+            self.cancel(run_id)
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.lag_monitor.stop()
+
+    def stats(self) -> Dict:
+        """Scheduler statistics"""
+        return {
+            "max_concurrent": self.max_concurrent,
+            "running": len(self._tasks),
+            "queued": len(self._pending),
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "failed": self.failed,
+            "event_loop_lag": self.lag_monitor.stats(),
+        }
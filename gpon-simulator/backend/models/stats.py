@@ -0,0 +1,13 @@
+"""
+Summary statistics
+Shared by recovery reports, event-loop lag tracking and the load harness.
+"""
+from typing import Sequence
+import math
+
+def percentile(ordered: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile of a sorted sample list (0.0 when empty)"""
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct * len(ordered) / 100.0) - 1))
+    return ordered[rank]
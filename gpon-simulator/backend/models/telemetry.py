@@ -0,0 +1,298 @@
+"""
+Per-device telemetry store
+Fixed-length ring buffers kept in one preallocated 2-D NumPy array per metric
+(rows = device slots, columns = samples), so memory is predictable:
+capacity x len(METRICS) x history x itemsize bytes. Capacity grows by
+grow_step rows and never beyond max_capacity; devices past that are not
+tracked.
+"""
+from typing import Dict, List, Optional, Tuple
+import time
+
+import numpy as np
+
+METRICS: Tuple[str, ...] = (
+    "uptime",
+    "packets_sent",
+    "packets_received",
+    "bytes_sent",
+    "bytes_received",
+    "errors",
+    "cpu_usage",
+    "memory_usage",
+    "rx_level_dbm",
+    "tx_level_dbm",
+)
+
+AGGREGATIONS = ("latest", "mean", "max", "delta")
+
+class TelemetryStore:
+    """Ring-buffered per-device metric history with vectorized sampling"""
+
+    def __init__(self, capacity: int = 1024, history: int = 60,
+                 max_capacity: Optional[int] = None, grow_step: int = 1024,
+                 dtype=np.float32, seed: Optional[int] = None):
+        self.capacity = capacity
+        self.max_capacity = capacity if max_capacity is None else max(capacity, max_capacity)
+        self.grow_step = grow_step
+        self._untracked: set = set()  # devices refused at max_capacity
+        self.history = history
+        self.dtype = np.dtype(dtype)
+        self.data: Dict[str, np.ndarray] = {
+            metric: np.zeros((capacity, history), dtype=self.dtype) for metric in METRICS
+        }
+        self.timestamps = np.zeros(history, dtype=np.float64)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.online = np.zeros(capacity, dtype=bool)
+        # Per-slot baselines the simulated sampler drifts around
+        self._rx_base = np.full(capacity, -26.0, dtype=self.dtype)
+        self._tx_base = np.full(capacity, 2.0, dtype=self.dtype)
+        self._index: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = [None] * capacity
+        self._free: List[int] = list(range(capacity - 1, -1, -1))
+        self._head = 0  # next column to write
+        self._count = 0  # samples written, saturates at history
+        self._rng = np.random.default_rng(seed)
+
+    # Device slots
+
+    def register(self, device_id: str, online: bool = False,
+                 rx_level_dbm: float = -26.0, tx_level_dbm: float = 2.0) -> Optional[int]:
+        """Allocate a row for a device, returns the slot index (None when full)"""
+        slot = self._index.get(device_id)
+        if slot is not None:
+            self.online[slot] = online
+            return slot
+        if not self._free:
+            if self.capacity >= self.max_capacity:
+                self._untracked.add(device_id)
+                return None
+            self._grow(min(self.capacity + self.grow_step, self.max_capacity))
+        slot = self._free.pop()
+        self._untracked.discard(device_id)
+        self._rx_base[slot] = rx_level_dbm
+        self._tx_base[slot] = tx_level_dbm
+        self.active[slot] = True
+        self.online[slot] = online
+        self._index[device_id] = slot
+        self._ids[slot] = device_id
+        return slot
+
+    def unregister(self, device_id: str) -> bool:
+        """Release a device row"""
+        self._untracked.discard(device_id)
+        slot = self._index.pop(device_id, None)
+        if slot is None:
+            return False
+        self.active[slot] = False
+        self.online[slot] = False
+        # Clear on release so register() never has to touch the buffers
+        for buffer in self.data.values():
+            buffer[slot].fill(0)
+        self._ids[slot] = None
+        self._free.append(slot)
+        return True
+
+    def set_online(self, device_id: str, online: bool):
+        """Update device online state"""
+        slot = self._index.get(device_id)
+        if slot is not None:
+            self.online[slot] = online
+
+    def sync(self, device_manager):
+        """Reconcile slots and online state with the device manager"""
+        devices = device_manager.devices
+        for device_id in self._index.keys() - devices.keys():
+            self.unregister(device_id)
+        for device in devices.values():
+            self.track(device)
+
+    def track(self, device):
+        """Register a device or refresh its online state"""
+        slot = self._index.get(device.id)
+        if slot is None:
+            self.register(
+                device.id,
+                online=device.status == "online",
+                rx_level_dbm=getattr(device, "rx_level_dbm", -26.0),
+                tx_level_dbm=getattr(device, "tx_level_dbm", 2.0),
+            )
+        else:
+            self.online[slot] = device.status == "online"
+
+    def attach(self, device_manager):
+        """Follow device manager changes instead of polling with sync()"""
+        self.sync(device_manager)
+        device_manager.add_listener(self._on_device_change)
+
+    def _on_device_change(self, action: str, device_id, device):
+        if action == "remove":
+            self.unregister(device_id)
+        elif action == "reset":
+            for tracked in list(self._index):
+                self.unregister(tracked)
+            self._untracked.clear()
+        else:
+            self.track(device)
+
+    def _grow(self, capacity: int):
+        """Reallocate buffers with more rows (only when full, by grow_step)"""
+        extra = capacity - self.capacity
+        for metric, buffer in self.data.items():
+            grown = np.zeros((capacity, self.history), dtype=self.dtype)
+            grown[:self.capacity] = buffer
+            self.data[metric] = grown
+        self.active = np.concatenate([self.active, np.zeros(extra, dtype=bool)])
+        self.online = np.concatenate([self.online, np.zeros(extra, dtype=bool)])
+        self._rx_base = np.concatenate([self._rx_base, np.full(extra, -26.0, dtype=self.dtype)])
+        self._tx_base = np.concatenate([self._tx_base, np.full(extra, 2.0, dtype=self.dtype)])
+        self._ids.extend([None] * extra)
+        self._free.extend(range(capacity - 1, self.capacity - 1, -1))
+        self.capacity = capacity
+
+    # Writing
+
+    def _last_column(self) -> int:
+        return (self._head - 1) % self.history
+
+    def _advance(self, timestamp: float):
+        self.timestamps[self._head] = timestamp
+        self._head = (self._head + 1) % self.history
+        self._count = min(self._count + 1, self.history)
+
+    def record(self, values: Dict[str, np.ndarray], timestamp: Optional[float] = None):
+        """Write one column for all slots; metrics not given carry forward"""
+        column = self._head
+        previous = self._last_column()
+        for metric, buffer in self.data.items():
+            if metric in values:
+                buffer[:, column] = values[metric]
+            elif self._count:
+                buffer[:, column] = buffer[:, previous]
+        self._advance(time.time() if timestamp is None else timestamp)
+
+    def sample(self, timestamp: Optional[float] = None):
+        """Generate and record one simulated sample for every device at once"""
+        now = time.time() if timestamp is None else timestamp
+        dt = max(0.0, now - self.timestamps[self._last_column()]) if self._count else 0.0
+        online = self.online & self.active
+        n = self.capacity
+        prev = {metric: buffer[:, self._last_column()] for metric, buffer in self.data.items()}
+        rng = self._rng
+
+        sent = np.where(online, rng.poisson(200 * dt, n), 0)
+        received = np.where(online, rng.poisson(300 * dt, n), 0)
+        values = {
+            "uptime": np.where(online, prev["uptime"] + dt, 0),
+            "packets_sent": prev["packets_sent"] + sent,
+            "packets_received": prev["packets_received"] + received,
+            "bytes_sent": prev["bytes_sent"] + sent * rng.integers(64, 1500, n),
+            "bytes_received": prev["bytes_received"] + received * rng.integers(64, 1500, n),
+            "errors": prev["errors"] + np.where(online, rng.poisson(0.01 * dt, n), 0),
+            "cpu_usage": np.where(
+                online, np.clip(prev["cpu_usage"] + rng.normal(0, 5, n), 1, 100), 0
+            ),
+            "memory_usage": np.where(
+                online, np.clip(prev["memory_usage"] + rng.normal(0, 2, n), 5, 95), 0
+            ),
+            "rx_level_dbm": self._rx_base + rng.normal(0, 0.2, n),
+            "tx_level_dbm": self._tx_base + rng.normal(0, 0.1, n),
+        }
+        # Devices coming online start from a plausible load rather than zero
+        fresh = online & (prev["memory_usage"] == 0)
+        if fresh.any():
+            values["cpu_usage"] = np.where(fresh, rng.uniform(5, 30, n), values["cpu_usage"])
+            values["memory_usage"] = np.where(fresh, rng.uniform(20, 40, n), values["memory_usage"])
+        self.record(values, now)
+
+    # Queries
+
+    def __contains__(self, device_id: str) -> bool:
+        return device_id in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _window_columns(self, window: Optional[int] = None) -> np.ndarray:
+        """Column indices of the last `window` samples, oldest first"""
+        size = self._count if window is None else max(1, min(window, self._count))
+        return (self._head - size + np.arange(size)) % self.history
+
+    def latest(self, device_id: str) -> Optional[Dict[str, float]]:
+        """Latest value of every metric for a device"""
+        slot = self._index.get(device_id)
+        if slot is None:
+            return None
+        if not self._count:
+            return {metric: 0.0 for metric in METRICS}
+        column = self._last_column()
+        return {metric: float(buffer[slot, column]) for metric, buffer in self.data.items()}
+
+    def series(self, device_id: str, metric: str,
+               limit: Optional[int] = None) -> Optional[Dict[str, List[float]]]:
+        """Chronological history of one metric for a device"""
+        slot = self._index.get(device_id)
+        if slot is None:
+            return None
+        if metric not in self.data:
+            raise ValueError(f"Unknown metric {metric}")
+        if not self._count:
+            return {"timestamps": [], "values": []}
+        columns = self._window_columns(limit)
+        return {
+            "timestamps": self.timestamps[columns].tolist(),
+            "values": self.data[metric][slot, columns].tolist(),
+        }
+
+    def top_k(self, metric: str, k: int = 10, agg: str = "latest",
+              window: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Top-K devices by metric over the last `window` samples"""
+        if metric not in self.data:
+            raise ValueError(f"Unknown metric {metric}")
+        if agg not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation {agg}")
+        if not self._count or not self._index or k <= 0:
+            return []
+
+        buffer = self.data[metric]
+        columns = self._window_columns(window)
+        if agg == "latest":
+            scores = buffer[:, columns[-1]].astype(np.float64)
+        elif agg == "mean":
+            scores = buffer[:, columns].mean(axis=1, dtype=np.float64)
+        elif agg == "max":
+            scores = buffer[:, columns].max(axis=1).astype(np.float64)
+        else:
+            scores = buffer[:, columns[-1]].astype(np.float64) - buffer[:, columns[0]]
+        scores[~self.active] = -np.inf
+
+        k = min(k, len(self._index))
+        candidates = np.argpartition(scores, -k)[-k:]
+        ordered = candidates[np.argsort(scores[candidates])[::-1]]
+        return [(self._ids[slot], float(scores[slot])) for slot in ordered]
+
+    def memory_bytes(self) -> int:
+        """Bytes held by metric buffers"""
+        return sum(buffer.nbytes for buffer in self.data.values()) + self.timestamps.nbytes
+
+    def stats(self) -> Dict:
+        """Store statistics"""
+        return {
+            "devices": len(self._index),
+            "capacity": self.capacity,
+            "max_capacity": self.max_capacity,
+            "untracked": len(self._untracked),
+            "history": self.history,
+            "samples": self._count,
+            "metrics": list(METRICS),
+            "memory_bytes": self.memory_bytes(),
+        }
+
+    def reset(self):
+        """Drop all devices and history"""
+        for device_id in list(self._index):
+            self.unregister(device_id)
+        self._untracked.clear()
+        self.timestamps.fill(0)
+        self._head = 0
+        self._count = 0
@@ -0,0 +1,140 @@
+"""
+ONT activation engine: discovery, authorization and recovery reports
+"""
+import asyncio
+
+import pytest
+
+from models.activation import ActivationEngine, O5_OPERATION
+from models.device import DeviceManager, ONT, OLT
+from models.omci import OMCIMibManager
+
+def make_ont(index: int, authorized: bool = True, pon_port: str = "0/1") -> ONT:
+    return ONT(id=f"ont-{index}", name=f"ONT {index}", serial_number=f"TEST{index:08d}",
+               pon_port=pon_port, olt_id="olt-1", status="online", authorized=authorized)
+
+@pytest.fixture
+def network():
+    device_manager = DeviceManager()
+    device_manager.add_device(OLT(id="olt-1", name="OLT", status="online"))
+    engine = ActivationEngine(device_manager, OMCIMibManager(), ranging_failure_rate=0.0, seed=7)
+    return device_manager, engine
+
+def add_onts(device_manager, count: int, **kwargs):
+    for index in range(count):
+        device_manager.add_device(make_ont(index, pon_port=f"0/{index % 2}", **kwargs))
+
+def test_olt_reboot_recovers_every_authorized_ont(network):
+    device_manager, engine = network
+    add_onts(device_manager, 40)
+    report = engine.reboot_olt("olt-1")
+    assert device_manager.get_device("olt-1").status == "offline"
+    assert report.onts_total == 40 and report.pon_ports == 2
+
+    elapsed = engine.run_until_idle()
+    assert report.completed
+    assert report.onts_in_service == 40
+    # Nothing comes back before the OLT has booted
+    assert report.time_to_first_service_s >= engine.olt_boot_time_s
+    assert report.time_to_first_service_s <= report.p50_service_s <= report.p95_service_s
+    assert report.p95_service_s <= report.time_to_full_service_s <= elapsed
+    assert device_manager.get_device("olt-1").status == "online"
+    for index in range(40):
+        state = engine.get_state(f"ont-{index}")
+        assert state["state"] == O5_OPERATION and state["in_service"]
+        assert 0 <= state["eqd_us"] <= 200
+        assert device_manager.get_device(f"ont-{index}").status == "online"
+    # ONU-IDs are unique per port
+    for port in ("0/0", "0/1"):
+        ids = [engine.get_state(f"ont-{i}")["onu_id"] for i in range(40) if i % 2 == int(port[-1])]
+        assert len(ids) == len(set(ids))
+
+def test_unauthorized_onts_are_rejected(network):
+    device_manager, engine = network
+    device_manager.add_device(make_ont(1))
+    device_manager.add_device(make_ont(2, authorized=False))
+    report = engine.reboot_olt("olt-1")
+    engine.run_until_idle()
+
+    assert report.completed
+    assert report.onts_in_service == 1
+    assert report.rejected_serials == ["TEST00000002"]
+    assert engine.get_state("ont-2")["rejected"]
+    assert device_manager.get_device("ont-2").status == "offline"
+
+def test_authorize_revives_a_rejected_ont(network):
+    device_manager, engine = network
+    device_manager.add_device(make_ont(1, authorized=False))
+    engine.reboot_ont(device_manager.get_device("ont-1"))
+    engine.run_until_idle()
+    assert engine.get_state("ont-1")["rejected"]
+
+    engine.authorize("TEST00000001", "olt-1", "0/1")
+    engine.run_until_idle()
+    assert device_manager.get_device("ont-1").status == "online"
+    assert device_manager.get_device("ont-1").authorized
+
+def test_revoke_rejects_on_next_activation(network):
+    device_manager, engine = network
+    device_manager.add_device(make_ont(1))
+    engine.reboot_ont(device_manager.get_device("ont-1"))
+    engine.run_until_idle()
+    assert device_manager.get_device("ont-1").status == "online"
+
+    assert engine.revoke("TEST00000001")
+    assert not device_manager.get_device("ont-1").authorized
+    report = engine.reboot_ont(device_manager.get_device("ont-1"))
+    engine.run_until_idle()
+    assert report.completed and report.rejected_serials == ["TEST00000001"]
+    assert device_manager.get_device("ont-1").status == "offline"
+
+def test_wrong_port_is_rejected(network):
+    device_manager, engine = network
+    device_manager.add_device(make_ont(1))
+    engine.authorize("TEST00000001", "olt-1", "0/7")
+    report = engine.reboot_ont(device_manager.get_device("ont-1"))
+    engine.run_until_idle()
+    assert report.rejected_serials == ["TEST00000001"]
+
+def test_newer_outage_takes_over_recovering_onts(network):
+    device_manager, engine = network
+    add_onts(device_manager, 3)
+    first = engine.reboot_ont(device_manager.get_device("ont-0"))
+    second = engine.reboot_olt("olt-1")
+
+    assert first.completed and first.onts_total == 0
+    engine.run_until_idle()
+    assert second.completed and second.onts_in_service == 3
+
+def test_known_mibs_skip_the_full_download(network):
+    device_manager, engine = network
+    add_onts(device_manager, 8)
+    fresh = engine.reboot_olt("olt-1")
+    engine.run_until_idle()
+    warm = engine.reboot_olt("olt-1")
+    engine.run_until_idle()
+    # Matching MIB data sync counters only need the sync check
+    assert warm.time_to_full_service_s - engine.olt_boot_time_s < fresh.time_to_full_service_s - engine.olt_boot_time_s
+    assert warm.mib_resyncs == 0
+
+def test_discovery_collisions_are_retried(network):
+    device_manager, _ = network
+    engine = ActivationEngine(device_manager, OMCIMibManager(), sn_slots=8,
+                              max_onus_per_port=128, ranging_failure_rate=0.0, seed=1)
+    for index in range(64):
+        device_manager.add_device(make_ont(index))
+    report = engine.reboot_olt("olt-1")
+    asyncio.run(engine.run_until_idle_async())
+    assert report.sn_collisions > 0
+    assert report.discovery_windows > 1
+    assert report.onts_in_service == 64
+
+def test_advance_follows_the_clock(network):
+    device_manager, engine = network
+    add_onts(device_manager, 2)
+    report = engine.reboot_olt("olt-1")
+    engine.advance(engine.olt_boot_time_s / 2)
+    assert report.onts_in_service == 0
+    assert engine.clock == pytest.approx(engine.olt_boot_time_s / 2)
+    engine.advance(engine.olt_boot_time_s * 2)
+    assert report.completed
@@ -0,0 +1,92 @@
+"""
+ARP engine: caches, change journal and batched gratuitous ARP
+"""
+from models.arp import ArpCache, ArpEngine
+from models.detection import DetectionEngine
+from models.device import DeviceManager
+from models.protocols import ProtocolSimulator
+
+def test_cache_expires_in_order_and_reports_drops():
+    dropped = []
+    cache = ArpCache(ttl_s=10.0, max_entries=2, on_drop=dropped.append)
+    assert cache.learn("10.0.0.1", "aa", now=0.0) is None
+    cache.learn("10.0.0.2", "bb", now=1.0)
+    assert cache.learn("10.0.0.1", "cc", now=2.0) == "aa"
+    cache.learn("10.0.0.3", "dd", now=3.0)  # evicts the least recently updated
+    assert dropped == ["10.0.0.2"]
+
+    assert cache.lookup("10.0.0.1", now=11.0) == "cc"
+    assert cache.expire(now=12.5) == 1
+    assert cache.lookup("10.0.0.3", now=14.0) is None
+    assert dropped == ["10.0.0.2", "10.0.0.1", "10.0.0.3"]
+    assert len(cache) == 0
+
+def test_journal_tracks_owner_changes_and_conflicts():
+    engine = ArpEngine()
+    changes = []
+    engine.add_listener(lambda *change: changes.append(change))
+    engine.learn("gw", "10.0.0.1", "aa", now=100.0)
+    engine.learn("gw", "10.0.0.1", "aa", now=101.0)  # refresh, not a change
+    engine.learn("gw", "10.0.0.1", "bb", now=102.0)
+
+    assert changes == [("10.0.0.1", "aa", None, "reply", 1), ("10.0.0.1", "bb", "aa", "reply", 1)]
+    assert engine.journal.owner("10.0.0.1") == "bb"
+    assert engine.journal.in_conflict("10.0.0.1", window_s=5.0, now=103.0)
+    assert not engine.journal.in_conflict("10.0.0.1", window_s=5.0, now=110.0)
+    assert [claim["mac"] for claim in engine.journal.claimants("10.0.0.1", 60.0, now=103.0)] == ["bb", "aa"]
+    assert [entry["mac"] for entry in engine.journal.history("10.0.0.1")] == ["aa", "bb"]
+
+    engine.forget("10.0.0.1")
+    assert engine.journal.owner("10.0.0.1") is None
+    assert "10.0.0.1" not in engine.cache("gw")
+    assert engine.resolve("gw", "10.0.0.1", now=104.0) is None
+
+def test_batch_journals_every_flip_and_notifies_once_per_ip():
+    engine = ArpEngine()
+    changes = []
+    engine.add_listener(lambda *change: changes.append(change))
+    engine.learn("host-1", "10.0.0.1", "aa", now=0.0)
+    for index in range(300):
+        engine.submit_gratuitous("10.0.0.1", "aa" if index % 2 else "ee")
+    engine.submit_gratuitous("10.0.0.2", "ff")
+    engine.submit_gratuitous("10.0.0.2", "ff")
+
+    assert engine.process_batch(now=1.0, extra_receivers=["gw"]) == 302
+    assert engine.journal.total_changes == 1 + 300 + 1
+    assert changes[1:] == [("10.0.0.1", "aa", "ee", "gratuitous", 300),
+                           ("10.0.0.2", "ff", None, "gratuitous", 1)]
+    # The holder and the extra receivers end with the winning MAC
+    assert engine.cache("host-1").lookup("10.0.0.1", 1.0) == "aa"
+    assert engine.cache("gw").lookup("10.0.0.2", 1.0) == "ff"
+
+def test_batch_respects_max_items_and_queue_bound():
+    engine = ArpEngine(max_pending=5)
+    for index in range(8):
+        engine.submit_gratuitous(f"10.0.0.{index}", "aa")
+    assert engine.dropped == 3 and engine.pending == 5
+    assert engine.process_batch(max_items=2, now=0.0) == 2
+    assert engine.pending == 3
+
+def test_holder_map_stays_bounded_by_the_caches():
+    engine = ArpEngine(cache_size=64)
+    for index in range(5000):
+        engine.learn("gw", f"10.{index // 65536}.{index // 256 % 256}.{index % 256}", "aa", now=0.0)
+    assert engine.stats()["holder_ips"] == 64
+
+    # Expired entries are neither refreshed by gratuitous ARP nor kept as holders
+    engine.submit_gratuitous("10.0.19.135", "bb")  # index 4999, the newest entry
+    engine.process_batch(now=1000.0)
+    assert "10.0.19.135" not in engine.cache("gw")
+    assert engine.stats()["holder_ips"] == 63
+    assert engine.expire(now=1000.0) == 63
+    assert engine.stats()["holder_ips"] == 0
+
+def test_flapping_batch_raises_change_rate_alert():
+    device_manager = DeviceManager()
+    simulator = ProtocolSimulator(device_manager)
+    detection = DetectionEngine()
+    simulator.add_event_listener(detection.process)
+    for index in range(10):
+        simulator.arp.submit_gratuitous("192.168.1.1", "aa" if index % 2 else "bb")
+    simulator.arp.process_batch()
+    assert {"arp_spoofing", "arp_change_rate"} <= {alert.rule_id for alert in detection.alerts}
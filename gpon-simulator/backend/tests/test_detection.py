@@ -0,0 +1,75 @@
+"""
+Streaming detection: sliding-window counters and rule evaluation
+"""
+from models.detection import DetectionEngine, SlidingWindowCounter
+
+def test_counter_slides_out_old_buckets():
+    counter = SlidingWindowCounter(window_s=10.0, buckets=10)
+    for second in range(5):
+        counter.add("mac-1", 100.0 + second)
+    assert counter.add("mac-1", 104.5) == 6
+    # Buckets for seconds 100-102 have left the window ending at 112.5
+    assert counter.add("mac-1", 112.5) == 4
+    # A gap longer than the window starts over
+    assert counter.add("mac-1", 200.0) == 1
+
+def test_counter_weights_and_late_events():
+    counter = SlidingWindowCounter(window_s=10.0, buckets=10)
+    assert counter.add("ip", 50.0, weight=7) == 7
+    assert counter.add("ip", 51.0, weight=3) == 10
+    # Older than the window: ignored, the current total is returned
+    assert counter.add("ip", 30.0) == 10
+
+def test_counter_evicts_least_recent_key():
+    counter = SlidingWindowCounter(window_s=10.0, max_keys=2)
+    counter.add("a", 1.0)
+    counter.add("b", 1.0)
+    counter.add("a", 2.0)
+    counter.add("c", 2.0)
+    assert len(counter) == 2
+    assert counter.add("b", 3.0) == 1  # evicted, so counting restarts
+
+def discover(mac: str, ts: float) -> dict:
+    return {"type": "dhcp_discover", "ts": ts, "server": "192.168.1.1",
+            "mac": mac, "source_mac": mac, "ip": "192.168.1.10"}
+
+def test_discover_flood_alert_is_raised_once_and_deduplicated():
+    engine = DetectionEngine()
+    raised = []
+    engine.add_listener(raised.append)
+    for index in range(19):
+        assert engine.process(discover("aa:aa", 1000.0 + index * 0.1)) == []
+    alerts = engine.process(discover("aa:aa", 1002.0))
+    assert [alert.rule_id for alert in alerts] == ["dhcp_discover_flood"]
+    assert alerts[0].observed == 20
+    assert raised == alerts
+
+    # Further hits within the dedup window update the open alert
+    engine.process(discover("aa:aa", 1002.5))
+    assert len(engine.alerts) == 1
+    assert engine.alerts[0].count == 2
+    assert engine.alerts_suppressed == 1
+
+    # Another source is its own key
+    for index in range(20):
+        engine.process(discover("bb:bb", 1003.0 + index * 0.1))
+    assert [alert.key for alert in engine.get_alerts()] == ["bb:bb", "aa:aa"]
+
+def test_batched_arp_updates_count_every_change():
+    engine = DetectionEngine()
+    event = {"type": "arp_update", "ts": 500.0, "ip": "192.168.1.1",
+             "mac": "66:66", "previous_mac": "11:11", "count": 6}
+    rule_ids = {alert.rule_id for alert in engine.process(event)}
+    assert rule_ids == {"arp_spoofing", "arp_change_rate"}
+
+def test_unrelated_events_and_conditions():
+    engine = DetectionEngine()
+    assert engine.process({"type": "unknown", "ts": 1.0}) == []
+    # Same MAC re-announced is not an overwrite
+    same = {"type": "arp_update", "ts": 1.0, "ip": "10.0.0.1", "mac": "aa", "previous_mac": "aa"}
+    assert engine.process(same) == []
+    exhausted = {"type": "dhcp_discover", "ts": 2.0, "server": "dhcp", "mac": "cc", "source_mac": "cc", "ip": None}
+    assert [alert.rule_id for alert in engine.process(exhausted)] == ["dhcp_pool_exhausted"]
+    assert engine.stats()["events_processed"] == 3
+    engine.reset()
+    assert engine.stats()["events_processed"] == 0 and not engine.alerts
@@ -0,0 +1,133 @@
+"""
+Device indexes, cursor pagination, field projection and ETags
+"""
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import pytest
+
+from api.devices import router as devices_router
+from api.responses import decode_cursor, encode_cursor
+from api.topology import router as topology_router
+from models.device import DeviceManager, OrderedIndex, ONT, OLT
+
+def make_ont(index: int, olt_id: str = "olt-1") -> ONT:
+    return ONT(id=f"ont-{index}", name=f"ONT {index}", serial_number=f"TEST{index:08d}",
+               pon_port="0/1", olt_id=olt_id, status="online")
+
+def walk(manager: DeviceManager, limit: int, **filters):
+    """Follow next cursors to the end, returns all IDs seen"""
+    seen, after = [], 0
+    while True:
+        devices, next_seq, _ = manager.page_devices(after_seq=after, limit=limit, **filters)
+        seen += [device.id for device in devices]
+        if next_seq is None:
+            return seen
+        after = next_seq
+
+def test_ordered_index_pages_skip_tombstones():
+    index = OrderedIndex()
+    for seq in range(1, 11):
+        index.add(f"d{seq}", seq)
+    index.remove("d3")
+    index.remove("d4")
+
+    ids, last = index.page(0, 3)
+    assert ids == ["d1", "d2", "d5"] and last == 5
+    ids, last = index.page(last, 100)
+    assert ids == ["d6", "d7", "d8", "d9", "d10"]
+    assert len(index) == 8
+
+    # Re-adding with the old sequence number revives the slot in place
+    index.add("d3", 3)
+    assert index.page(0, 3)[0] == ["d1", "d2", "d3"]
+
+def test_ordered_index_compacts_tombstones():
+    index = OrderedIndex()
+    for seq in range(1, 501):
+        index.add(f"d{seq}", seq)
+    for seq in range(1, 491):
+        index.remove(f"d{seq}")
+    assert len(index._seqs) < 100
+    assert index.page(0, 100)[0] == [f"d{seq}" for seq in range(491, 501)]
+
+def test_page_devices_by_type_and_parent():
+    manager = DeviceManager()
+    manager.add_device(OLT(id="olt-1", name="OLT 1"))
+    manager.add_device(OLT(id="olt-2", name="OLT 2"))
+    for index in range(25):
+        manager.add_device(make_ont(index, olt_id="olt-1" if index % 2 == 0 else "olt-2"))
+
+    assert len(walk(manager, 4)) == 27
+    assert walk(manager, 5, device_type="ONT") == [f"ont-{index}" for index in range(25)]
+    assert walk(manager, 3, device_type="ONT", parent="olt-2") == [f"ont-{index}" for index in range(1, 25, 2)]
+
+    devices, next_seq, total = manager.page_devices(limit=5, device_type="ONT", parent="olt-1")
+    assert total == 13 and len(devices) == 5 and next_seq is not None
+    assert manager.page_devices(device_type="Server") == ([], None, 0)
+
+def test_page_devices_follows_updates_and_removals():
+    manager = DeviceManager()
+    for index in range(6):
+        manager.add_device(make_ont(index))
+
+    devices, next_seq, _ = manager.page_devices(limit=3)
+    assert [device.id for device in devices] == ["ont-0", "ont-1", "ont-2"]
+    # Removing an already returned device does not shift the next page
+    manager.remove_device("ont-1")
+    devices, _, total = manager.page_devices(after_seq=next_seq, limit=3)
+    assert [device.id for device in devices] == ["ont-3", "ont-4", "ont-5"]
+    assert total == 5
+
+    # Moving to another OLT re-indexes by parent but keeps the position
+    manager.update_device("ont-4", olt_id="olt-9")
+    assert walk(manager, 2, parent="olt-9") == ["ont-4"]
+    assert "ont-4" not in walk(manager, 2, parent="olt-1")
+    assert walk(manager, 10) == ["ont-0", "ont-2", "ont-3", "ont-4", "ont-5"]
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(12345)) == 12345
+    assert encode_cursor(None) is None
+    assert decode_cursor(None) == 0
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(devices_router, prefix="/api/devices")
+    app.include_router(topology_router, prefix="/api/topology")
+    app.state.device_manager = DeviceManager()
+    app.state.device_manager.add_device(OLT(id="olt-1", name="OLT 1"))
+    for index in range(3):
+        app.state.device_manager.add_device(make_ont(index))
+    return TestClient(app)
+
+def test_field_projection(client):
+    response = client.get("/api/devices/?fields=id,rx_level_dbm")
+    assert response.status_code == 200
+    assert response.json()["devices"][:2] == [
+        {"id": "olt-1", "rx_level_dbm": None},
+        {"id": "ont-0", "rx_level_dbm": -26.0},
+    ]
+    for name in ("__class__", "__dict__", "model_dump", "model_fields", "nope"):
+        assert client.get(f"/api/devices/ont-0?fields={name}").status_code == 400
+        assert client.get(f"/api/topology/?fields=id,{name}").status_code == 400
+    assert client.get("/api/devices/ont-0?fields=id,status").json() == {"id": "ont-0", "status": "online"}
+
+def test_etag_revalidation(client):
+    first = client.get("/api/devices/?limit=2")
+    etag = first.headers["etag"]
+    assert client.get("/api/devices/?limit=2", headers={"If-None-Match": etag}).status_code == 304
+    # Another query is another representation
+    assert client.get("/api/devices/?limit=3", headers={"If-None-Match": etag}).status_code == 200
+
+    client.app.state.device_manager.update_device("ont-0", status="offline")
+    changed = client.get("/api/devices/?limit=2", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+def test_cursor_pagination_over_http(client):
+    page = client.get("/api/devices/?limit=2").json()
+    assert [device["id"] for device in page["devices"]] == ["olt-1", "ont-0"]
+    page = client.get(f"/api/devices/?limit=2&cursor={page['next_cursor']}").json()
+    assert [device["id"] for device in page["devices"]] == ["ont-1", "ont-2"]
+    assert page["next_cursor"] is None
+    assert client.get("/api/devices/?cursor=!!!").status_code == 400
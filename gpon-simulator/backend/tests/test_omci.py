@@ -0,0 +1,108 @@
+"""
+OMCI MIB model: incremental class hashes, data sync counter and audits
+"""
+import asyncio
+
+from models.device import DeviceManager, ONT
+from models.omci import (
+    ME_SOFTWARE_IMAGE, ME_VLAN_TAGGING_FILTER, OMCIMibManager, OntMib, build_default_mib
+)
+from models.protocols import ProtocolSimulator
+
+def make_ont(index: int) -> ONT:
+    return ONT(id=f"ont-{index}", name=f"ONT {index}", serial_number=f"TEST{index:08d}",
+               pon_port="0/1", olt_id="olt-1", status="online")
+
+def test_class_hash_is_order_independent_and_incremental():
+    first, second = OntMib("a"), OntMib("b")
+    first.create(ME_VLAN_TAGGING_FILTER, 1, {"vlan_filter_list": [100]})
+    first.create(ME_VLAN_TAGGING_FILTER, 2, {"vlan_filter_list": [200]})
+    second.create(ME_VLAN_TAGGING_FILTER, 2, {"vlan_filter_list": [200]})
+    second.create(ME_VLAN_TAGGING_FILTER, 1, {"vlan_filter_list": [999]})
+    assert first.class_hashes != second.class_hashes
+
+    second.set(ME_VLAN_TAGGING_FILTER, 1, {"vlan_filter_list": [100]})
+    assert first.class_hashes == second.class_hashes
+
+    # Deleting the last instance drops the class hash entirely
+    first.delete(ME_VLAN_TAGGING_FILTER, 1)
+    first.delete(ME_VLAN_TAGGING_FILTER, 2)
+    assert ME_VLAN_TAGGING_FILTER not in first.class_hashes
+    assert not first.set(ME_VLAN_TAGGING_FILTER, 1, {})
+
+def test_mib_data_sync_wraps_and_skips_zero():
+    mib = OntMib("a")
+    for index in range(256):
+        mib.create(ME_SOFTWARE_IMAGE, 0, {"version": str(index)})
+    assert mib.mib_data_sync == 1
+
+def test_changes_through_the_olt_stay_in_sync():
+    manager = OMCIMibManager()
+    ont = make_ont(1)
+    manager.apply(ont, "set", ME_SOFTWARE_IMAGE, 0, {"version": "2.0"})
+
+    result = manager.audit(ont.id)
+    assert result.in_sync
+    assert result.entities_uploaded == 0
+
+def test_divergence_is_reported_until_repaired():
+    manager = OMCIMibManager()
+    ont = make_ont(1)
+    full = build_default_mib(ont).entity_count()
+    manager.apply(ont, "set", ME_VLAN_TAGGING_FILTER, 1, {"vlan_filter_list": [666]}, via_olt=False)
+
+    for _ in range(2):
+        result = manager.audit(ont.id)
+        assert not result.in_sync
+        assert result.divergent_classes == [ME_VLAN_TAGGING_FILTER]
+        assert [change["instance_id"] for change in result.changes] == [1]
+        assert result.changes[0]["actual"]["vlan_filter_list"] == [666]
+        # Only the divergent class is uploaded
+        assert 0 < result.entities_uploaded < full
+
+    repaired = manager.audit(ont.id, repair=True)
+    assert repaired.repaired
+    mib, mirror = manager.ensure(ont)
+    assert mib.class_hashes == mirror.class_hashes
+    assert mib.get(ME_VLAN_TAGGING_FILTER, 1)["vlan_filter_list"] == [100]
+    assert manager.audit(ont.id).in_sync
+
+def test_counter_drift_without_changes_realigns():
+    manager = OMCIMibManager()
+    ont = make_ont(1)
+    mib, mirror = manager.ensure(ont)
+    mib.mib_data_sync = (mib.mib_data_sync % 255) + 1
+
+    result = manager.audit(ont.id)
+    assert result.in_sync and not result.divergent_classes
+    assert mirror.mib_data_sync == mib.mib_data_sync
+
+def test_audit_all_reports_only_divergent_onts():
+    manager = OMCIMibManager()
+    onts = [make_ont(index) for index in range(4)]
+    for ont in onts:
+        manager.ensure(ont)
+    manager.apply(onts[2], "set", ME_SOFTWARE_IMAGE, 0, {"version": "rogue"}, via_olt=False)
+
+    report = manager.audit_all()
+    assert report["audited"] == 4
+    assert [result.ont_id for result in report["divergent"]] == ["ont-2"]
+    assert report["entities_uploaded"] < report["entities_full_upload"]
+
+    async_report = asyncio.run(manager.audit_all_async(repair=True))
+    assert [result.ont_id for result in async_report["divergent"]] == ["ont-2"]
+    assert manager.audit_all()["divergent"] == []
+
+def test_mibs_follow_device_removal():
+    device_manager = DeviceManager()
+    simulator = ProtocolSimulator(device_manager)
+    for index in range(3):
+        device_manager.add_device(make_ont(index))
+        simulator.omci_mib.ensure(device_manager.get_device(f"ont-{index}"))
+
+    device_manager.remove_device("ont-1")
+    assert sorted(simulator.omci_mib.ont_mibs) == ["ont-0", "ont-2"]
+    assert asyncio.run(simulator.audit_omci_mibs())["audited"] == 2
+
+    device_manager.reset()
+    assert not simulator.omci_mib.ont_mibs and not simulator.omci_mib.olt_mibs
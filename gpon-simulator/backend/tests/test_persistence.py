@@ -0,0 +1,171 @@
+"""
+Write-behind persistence against a local SQLite file
+"""
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from db.persistence import WriteBehindStore, attach_persistence, restore_state
+from models.device import DeviceManager, ONT, OLT
+from models.protocols import ProtocolSimulator
+from models.scenarios import ScenarioRunner
+
+@pytest.fixture
+def store(tmp_path):
+    return WriteBehindStore(url=f"sqlite:///{tmp_path / 'test.db'}")
+
+@pytest.fixture
+def sim(store):
+    device_manager = DeviceManager()
+    protocol_simulator = ProtocolSimulator(device_manager)
+    scenario_runner = ScenarioRunner(device_manager, protocol_simulator)
+    attach_persistence(store, device_manager, protocol_simulator, scenario_runner)
+    return device_manager, protocol_simulator
+
+def make_ont(index: int) -> ONT:
+    return ONT(id=f"ont-{index}", name=f"ONT {index}", serial_number=f"TEST{index:08d}",
+               pon_port="0/1", olt_id="olt-1", status="online")
+
+def test_upserts_coalesce_per_key(store, sim):
+    device_manager, _ = sim
+    device_manager.add_device(make_ont(1))
+    for status in ("offline", "error", "online", "offline"):
+        device_manager.update_device("ont-1", status=status)
+
+    assert store.pending == 1
+    assert store.coalesced == 4
+    assert store.flush() == 1
+
+    rows = store.load("devices")
+    assert len(rows) == 1
+    assert rows[0]["status"] == "offline"
+
+def test_delete_after_upsert(store, sim):
+    device_manager, _ = sim
+    device_manager.add_device(make_ont(1))
+    device_manager.add_device(make_ont(2))
+    store.flush()
+
+    device_manager.update_device("ont-1", status="offline")
+    device_manager.remove_device("ont-1")
+    device_manager.add_device(make_ont(3))
+    device_manager.remove_device("ont-3")
+    store.flush()
+
+    assert sorted(row["id"] for row in store.load("devices")) == ["ont-2"]
+
+def test_truncate_on_reset(store, sim):
+    device_manager, _ = sim
+    for index in range(5):
+        device_manager.add_device(make_ont(index))
+    store.flush()
+    assert len(store.load("devices")) == 5
+
+    device_manager.reset()
+    device_manager.add_device(make_ont(9))
+    store.flush()
+
+    assert [row["id"] for row in store.load("devices")] == ["ont-9"]
+
+def test_failed_flush_is_requeued_without_clobbering_newer_changes(store, sim, monkeypatch):
+    device_manager, _ = sim
+    device_manager.add_device(make_ont(1))
+    device_manager.add_device(make_ont(2))
+
+    def broken_begin():
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(store.engine, "begin", broken_begin)
+    assert store.flush() == 0
+    assert store.errors == 1
+    assert store.pending == 2
+
+    # A change made while the batch was failing wins over the requeued row
+    device_manager.update_device("ont-1", status="error")
+    monkeypatch.undo()
+    assert store.flush() == 2
+    assert store.pending == 0
+
+    rows = {row["id"]: row for row in store.load("devices")}
+    assert set(rows) == {"ont-1", "ont-2"}
+    assert rows["ont-1"]["status"] == "error"
+
+def test_restore_state_round_trip(store, sim):
+    device_manager, protocol_simulator = sim
+    device_manager.add_device(OLT(id="olt-1", name="OLT", status="online"))
+    device_manager.add_device(make_ont(1))
+    device_manager.update_device("ont-1", status="offline", firmware_version="2.1")
+
+    async def lease_traffic():
+        for index in range(3):
+            await protocol_simulator.dhcp_discover(f"aa:bb:cc:00:00:0{index}")
+        await protocol_simulator.dhcp_release("aa:bb:cc:00:00:01")
+
+    asyncio.run(lease_traffic())
+    asyncio.run(store.stop())
+
+    restored_devices = DeviceManager()
+    restored_protocols = ProtocolSimulator(restored_devices)
+    counts = restore_state(store, restored_devices, restored_protocols)
+
+    assert counts == {"devices": 2, "leases": 2}
+    ont = restored_devices.get_device("ont-1")
+    assert isinstance(ont, ONT)
+    assert ont.status == "offline"
+    assert ont.firmware_version == "2.1"
+    assert restored_devices.get_device("olt-1").type == "OLT"
+    assert set(restored_protocols.dhcp_pool) == {"aa:bb:cc:00:00:00", "aa:bb:cc:00:00:02"}
+    assert restored_protocols.dhcp_pool == protocol_simulator.dhcp_pool
+    # Restored leases are reserved, so new clients get fresh addresses
+    leased_ips = set(restored_protocols.dhcp_pool.values())
+    new_ip = asyncio.run(restored_protocols.dhcp_discover("aa:bb:cc:00:00:09"))
+    assert new_ip is not None and new_ip not in leased_ips
+
+def test_rejected_rows_are_set_aside_after_retries(tmp_path):
+    store = WriteBehindStore(url=f"sqlite:///{tmp_path / 'test.db'}", max_retries=2)
+    store.upsert("devices", "ont-1", {"id": "ont-1", "type": "ONT", "name": "ONT 1", "status": "online",
+                                      "parent": None, "data": {}, "updated_at": datetime.now()})
+    # SQLite's DateTime type refuses strings, so this row fails every time
+    store.append("omci_logs", {"timestamp": "not a time", "ont_id": "ont-1", "command": "reboot",
+                               "success": True, "via_olt": True, "parameters": {}})
+
+    assert store.flush() == 0
+    assert store.pending == 2
+    written = store.flush()
+
+    assert written == 1
+    assert store.pending == 0
+    assert [row["id"] for row in store.load("devices")] == ["ont-1"]
+    assert store.rows_dropped == 1
+    assert [letter["table"] for letter in store.dead_letters] == ["omci_logs"]
+
+    # Later flushes are unaffected
+    store.append("omci_logs", {"timestamp": datetime.now(), "ont_id": "ont-1", "command": "reboot",
+                               "success": True, "via_olt": True, "parameters": {}})
+    assert store.flush() == 1
+
+def test_unreachable_database_keeps_retrying(store, sim, monkeypatch):
+    device_manager, _ = sim
+    device_manager.add_device(make_ont(1))
+
+    def broken():
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(store.engine, "begin", broken)
+    monkeypatch.setattr(store.engine, "connect", broken)
+    for _ in range(store.max_retries + 2):
+        assert store.flush() == 0
+    assert store.pending == 1
+    assert not store.dead_letters
+
+def test_pending_appends_are_bounded(tmp_path):
+    store = WriteBehindStore(url=f"sqlite:///{tmp_path / 'test.db'}", max_pending_appends=3)
+    for index in range(5):
+        store.append("omci_logs", {"timestamp": datetime.now(), "ont_id": f"ont-{index}",
+                                   "command": "reboot", "success": True, "via_olt": True,
+                                   "parameters": {}})
+    assert store.pending == 3
+    assert store.rows_dropped == 2
+    store.flush()
+    assert [row["ont_id"] for row in store.load("omci_logs")] == ["ont-2", "ont-3", "ont-4"]
@@ -0,0 +1,62 @@
+"""
+Scenario scheduler: priorities, concurrency limit and cancellation
+"""
+import asyncio
+
+from models.scheduler import ScenarioScheduler
+
+def test_cancel_before_first_step_frees_the_slot():
+    done = {}
+    started = []
+
+    async def scenario():
+        scheduler = ScenarioScheduler(max_concurrent=1)
+
+        def job(name):
+            async def run():
+                started.append(name)
+            return run
+
+        def on_done(run_id, error):
+            done[run_id] = error
+
+        scheduler.submit("a", job("a"), on_done=on_done)
+        assert scheduler.cancel("a")
+        scheduler.submit("b", job("b"), on_done=on_done)
+        for _ in range(5):
+            await asyncio.sleep(0)
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert started == ["b"]
+    assert isinstance(done["a"], asyncio.CancelledError)
+    assert done["b"] is None
+    assert (stats["running"], stats["queued"]) == (0, 0)
+    assert (stats["cancelled"], stats["completed"]) == (1, 1)
+
+def test_priority_order_and_failures():
+    order = []
+
+    async def scenario():
+        scheduler = ScenarioScheduler(max_concurrent=1)
+
+        def job(name):
+            async def run():
+                order.append(name)
+                if name == "broken":
+                    raise RuntimeError("step failed")
+            return run
+
+        scheduler.submit("low", job("low"), priority=0)
+        scheduler.submit("broken", job("broken"), priority=5)
+        scheduler.submit("high", job("high"), priority=5)
+        scheduler.submit("queued", job("queued"), priority=1)
+        assert scheduler.cancel("queued")
+        for _ in range(10):
+            await asyncio.sleep(0)
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    # The first submission starts immediately, the rest by priority, FIFO within one
+    assert order == ["low", "broken", "high"]
+    assert (stats["completed"], stats["failed"], stats["cancelled"]) == (2, 1, 1)
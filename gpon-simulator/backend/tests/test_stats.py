@@ -0,0 +1,18 @@
+"""
+Nearest-rank percentile
+"""
+from models.stats import percentile
+
+def test_percentile_nearest_rank():
+    samples = [float(value) for value in range(1, 101)]
+    for pct in range(1, 101):
+        assert percentile(samples, pct) == pct
+    twenty = [float(value) for value in range(1, 21)]
+    assert percentile(twenty, 95) == 19.0
+    assert percentile(twenty, 50) == 10.0
+
+def test_percentile_edges():
+    assert percentile([], 99) == 0.0
+    assert percentile([3.0], 1) == 3.0
+    assert percentile([3.0], 100) == 3.0
+    assert percentile([1.0, 2.0], 0) == 1.0
@@ -0,0 +1,51 @@
+"""
+Telemetry store: bounded capacity and device-driven registration
+"""
+import numpy as np
+
+from models.device import DeviceManager, ONT
+from models.telemetry import TelemetryStore
+
+def make_ont(index: int) -> ONT:
+    return ONT(id=f"ont-{index}", name=f"ONT {index}", serial_number=f"TEST{index:08d}",
+               pon_port="0/1", olt_id="olt-1", status="online")
+
+def test_capacity_grows_by_fixed_steps_up_to_the_cap():
+    store = TelemetryStore(capacity=4, max_capacity=10, grow_step=4, history=8)
+    slots = [store.register(f"dev-{index}") for index in range(12)]
+    assert store.capacity == 10
+    assert slots[:10] == list(range(10))
+    assert slots[10:] == [None, None]
+    assert store.stats()["untracked"] == 2
+    assert store.data["cpu_usage"].shape == (10, 8)
+
+    # A freed slot is reused before anything else
+    store.unregister("dev-3")
+    assert store.register("dev-10") == 3
+    assert store.stats()["untracked"] == 1
+
+def test_without_max_capacity_the_store_stays_fixed():
+    store = TelemetryStore(capacity=2, history=4)
+    assert store.register("a") is not None and store.register("b") is not None
+    assert store.register("c") is None
+    assert store.memory_bytes() == 2 * 10 * 4 * 4 + 4 * 8
+
+def test_store_follows_device_events():
+    device_manager = DeviceManager()
+    store = TelemetryStore(capacity=4, history=4, seed=1)
+    device_manager.add_device(make_ont(0))
+    store.attach(device_manager)
+    device_manager.add_device(make_ont(1))
+    assert "ont-0" in store and "ont-1" in store
+
+    device_manager.update_device("ont-1", status="offline")
+    store.sample(timestamp=10.0)
+    store.sample(timestamp=11.0)
+    assert store.latest("ont-0")["uptime"] == 1.0
+    assert store.latest("ont-1")["uptime"] == 0.0
+
+    device_manager.remove_device("ont-0")
+    assert "ont-0" not in store and len(store) == 1
+    device_manager.reset()
+    assert len(store) == 0
+    assert not np.any(store.active)
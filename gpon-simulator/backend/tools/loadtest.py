@@ -0,0 +1,405 @@
+"""
+Load generation harness for the GPON simulator API
+Drives a mix of REST polling, scenario starts and WebSocket subscribers
+either in-process over ASGI (main:app) or against a local uvicorn.
+
+Usage (from backend/):
+    python -m tools.loadtest --duration 30 --rest-clients 50 --ws-clients 20
+    python -m tools.loadtest --url http://localhost:8000 --scenario-rate 0.5
+    python -m tools.loadtest --compare loadtest_results/1.0.0-20240101T000000.json
+"""
+from typing import Dict, List, Optional, Any
+from pydantic import BaseModel, Field
+from datetime import datetime
+from pathlib import Path
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+import httpx
+
+from models.stats import percentile
+
+DEFAULT_MIX = {
+    "/api/status": 5,
+    "/api/metrics/": 3,
+    "/api/topology/": 1,
+}
+
+class LoadProfile(BaseModel):
+    """Load test configuration"""
+    url: Optional[str] = None  # None = in-process ASGI against main:app
+    duration_s: float = 30.0
+    rest_clients: int = 20
+    poll_interval_s: float = 1.0  # 0 = closed loop, as fast as possible
+    rest_mix: Dict[str, int] = Field(default_factory=lambda: dict(DEFAULT_MIX))
+    scenario_rate: float = 0.0  # scenario starts per second
+    ws_clients: int = 10
+    ws_path: str = "/ws"
+    seed: int = 0
+
+def summarize(samples: List[float], elapsed: float) -> Dict[str, float]:
+    """Summarize latency samples (seconds) as milliseconds"""
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "throughput_per_s": round(len(ordered) / elapsed, 2) if elapsed > 0 else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+
+class Recorder:
+    """Collects latency samples and errors per operation"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.ws_lag: List[float] = []
+        self.ws_messages = 0
+        self.ws_connected = 0
+        self.ws_failures = 0
+
+    def record(self, name: str, latency: float, ok: bool = True):
+        """Record a single request"""
+        self.latencies.setdefault(name, []).append(latency)
+        if not ok:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def record_message(self, message: Any):
+        """Record a WebSocket message and its lag if it carries a timestamp"""
+        self.ws_messages += 1
+        if isinstance(message, dict) and message.get("timestamp"):
+            try:
+                sent = datetime.fromisoformat(message["timestamp"])
+            except (TypeError, ValueError):
+                return
+            self.ws_lag.append(max(0.0, (datetime.now() - sent).total_seconds()))
+
+class ASGIWebSocket:
+    """Minimal in-process WebSocket client speaking ASGI directly to the app"""
+
+    def __init__(self, app, path: str):
+        self._app = app
+        self._path = path
+        self._to_app: asyncio.Queue = asyncio.Queue()
+        self._from_app: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    async def connect(self):
+        """Open the connection and wait for accept"""
+        scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "path": self._path,
+            "raw_path": self._path.encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [(b"host", b"loadtest")],
+            "client": ("127.0.0.1", 0),
+            "server": ("loadtest", 80),
+            "subprotocols": [],
+        }
+        await self._to_app.put({"type": "websocket.connect"})
+        self._task = asyncio.create_task(self._app(scope, self._to_app.get, self._send))
+        message = await self._from_app.get()
+        if message["type"] != "websocket.accept":
+            raise ConnectionError(f"WebSocket rejected: {message}")
+
+    async def _send(self, message: Dict):
+        if self._closed:
+            raise ConnectionError("Client disconnected")
+        await self._from_app.put(message)
+
+    async def recv(self) -> str:
+        """Receive next text frame"""
+        message = await self._from_app.get()
+        if message["type"] == "websocket.close":
+            raise ConnectionError("Server closed connection")
+        if message.get("text") is not None:
+            return message["text"]
+        return message.get("bytes", b"").decode()
+
+    async def close(self):
+        """Disconnect and wait for the endpoint to finish"""
+        self._closed = True
+        await self._to_app.put({"type": "websocket.disconnect", "code": 1000})
+        if self._task:
+            try:
+                await asyncio.wait_for(self._task, timeout=2.0)
+            except BaseException:
+                self._task.cancel()
+
+class LoadRunner:
+    """Runs a load profile and produces a report"""
+
+    def __init__(self, profile: LoadProfile):
+        self.profile = profile
+        self.recorder = Recorder()
+        self.app = None
+        self._rng = random.Random(profile.seed)
+        self._deadline = 0.0
+
+    def _client(self) -> httpx.AsyncClient:
+        if self.profile.url:
+            limits = httpx.Limits(max_connections=self.profile.rest_clients + 10)
+            return httpx.AsyncClient(base_url=self.profile.url, limits=limits, timeout=30.0)
+        return httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=self.app), base_url="http://loadtest", timeout=30.0
+        )
+
+    async def _timed(self, client: httpx.AsyncClient, name: str, method: str, path: str):
+        started = time.perf_counter()
+        ok = True
+        try:
+            response = await client.request(method, path)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        self.recorder.record(name, time.perf_counter() - started, ok)
+
+    async def _rest_worker(self, client: httpx.AsyncClient):
+        paths = list(self.profile.rest_mix.keys())
+        weights = list(self.profile.rest_mix.values())
+        # Stagger start so pollers don't fire in lockstep
+        await asyncio.sleep(self._rng.random() * self.profile.poll_interval_s)
+        while time.perf_counter() < self._deadline:
+            path = self._rng.choices(paths, weights)[0]
+            await self._timed(client, f"GET {path}", "GET", path)
+            if self.profile.poll_interval_s > 0:
+                await asyncio.sleep(self.profile.poll_interval_s)
+            else:
+                await asyncio.sleep(0)
+
+    async def _scenario_worker(self, client: httpx.AsyncClient, scenario_ids: List[str]):
+        if not scenario_ids:
+            return
+        interval = 1.0 / self.profile.scenario_rate
+        while time.perf_counter() < self._deadline:
+            scenario_id = self._rng.choice(scenario_ids)
+            await self._timed(
+                client, "POST /api/scenarios/{id}/run", "POST", f"/api/scenarios/{scenario_id}/run"
+            )
+            await asyncio.sleep(interval)
+
+    async def _open_ws(self):
+        if self.profile.url:
+            import websockets
+            ws_url = self.profile.url.replace("http", "ws", 1).rstrip("/") + self.profile.ws_path
+            return await websockets.connect(ws_url)
+        ws = ASGIWebSocket(self.app, self.profile.ws_path)
+        await ws.connect()
+        return ws
+
+    async def _ws_worker(self):
+        try:
+            ws = await self._open_ws()
+        except Exception:
+            self.recorder.ws_failures += 1
+            return
+        self.recorder.ws_connected += 1
+        try:
+            while True:
+                remaining = self._deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                try:
+                    self.recorder.record_message(json.loads(raw))
+                except ValueError:
+                    self.recorder.record_message(None)
+        except Exception:
+            self.recorder.ws_failures += 1
+        finally:
+            await ws.close()
+
+    async def _scenario_ids(self, client: httpx.AsyncClient) -> List[str]:
+        try:
+            response = await client.get("/api/scenarios/")
+            return [s["id"] for s in response.json().get("scenarios", [])]
+        except (httpx.HTTPError, ValueError, KeyError):
+            return []
+
+    async def _version(self, client: httpx.AsyncClient) -> str:
+        try:
+            return str((await client.get("/")).json().get("version", "unknown"))
+        except (httpx.HTTPError, ValueError):
+            return "unknown"
+
+    async def run(self) -> Dict:
+        """Execute the profile and return the report"""
+        if self.profile.url:
+            return await self._run()
+        # In-process runs start from an empty throwaway database, so saved dev
+        # state is neither restored nor polluted and runs stay comparable
+        with tempfile.TemporaryDirectory(prefix="gpon-loadtest-") as scratch:
+            previous_url = os.environ.get("DATABASE_URL")
+            os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(scratch, 'loadtest.db')}"
+            try:
+                from main import app
+                self.app = app
+                await app.router.startup()
+                try:
+                    return await self._run()
+                finally:
+                    await app.router.shutdown()
+            finally:
+                if previous_url is None:
+                    os.environ.pop("DATABASE_URL", None)
+                else:
+                    os.environ["DATABASE_URL"] = previous_url
+
+    async def _run(self) -> Dict:
+        async with self._client() as client:
+            version = await self._version(client)
+            scenario_ids = await self._scenario_ids(client) if self.profile.scenario_rate > 0 else []
+
+            started_at = datetime.now()
+            start = time.perf_counter()
+            self._deadline = start + self.profile.duration_s
+
+            tasks = [asyncio.create_task(self._ws_worker()) for _ in range(self.profile.ws_clients)]
+            tasks += [asyncio.create_task(self._rest_worker(client)) for _ in range(self.profile.rest_clients)]
+            if self.profile.scenario_rate > 0:
+                tasks.append(asyncio.create_task(self._scenario_worker(client, scenario_ids)))
+            await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - start
+
+        return self._report(version, started_at, elapsed)
+
+    def _report(self, version: str, started_at: datetime, elapsed: float) -> Dict:
+        rec = self.recorder
+        all_samples = [s for samples in rec.latencies.values() for s in samples]
+        endpoints = {}
+        for name, samples in sorted(rec.latencies.items()):
+            endpoints[name] = summarize(samples, elapsed)
+            endpoints[name]["errors"] = rec.errors.get(name, 0)
+
+        ws_summary = summarize(rec.ws_lag, elapsed)
+        return {
+            "version": version,
+            "target": self.profile.url or "in-process:main:app",
+            "started_at": started_at.isoformat(),
+            "elapsed_s": round(elapsed, 3),
+            "profile": self.profile.model_dump(),
+            "rest": {
+                "total": summarize(all_samples, elapsed),
+                "errors": sum(rec.errors.values()),
+                "endpoints": endpoints,
+            },
+            "websocket": {
+                "subscribers": self.profile.ws_clients,
+                "connected": rec.ws_connected,
+                "failures": rec.ws_failures,
+                "messages": rec.ws_messages,
+                "messages_per_s": round(rec.ws_messages / elapsed, 2) if elapsed > 0 else 0.0,
+                "lag_samples": ws_summary["count"],
+                "lag_p50_ms": ws_summary["p50_ms"],
+                "lag_p95_ms": ws_summary["p95_ms"],
+                "lag_p99_ms": ws_summary["p99_ms"],
+                "lag_max_ms": ws_summary["max_ms"],
+            },
+        }
+
+def save_report(report: Dict, output_dir: str) -> Path:
+    """Save report as JSON for cross-version comparison"""
+    directory = Path(output_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.fromisoformat(report["started_at"]).strftime("%Y%m%dT%H%M%S")
+    path = directory / f"{report['version']}-{stamp}.json"
+    path.write_text(json.dumps(report, indent=2))
+    return path
+
+def format_report(report: Dict, baseline: Optional[Dict] = None) -> str:
+    """Render report as a text table, with deltas against a baseline report"""
+
+    def delta(current: float, previous: Optional[float]) -> str:
+        if previous is None:
+            return ""
+        diff = current - previous
+        return f" ({'+' if diff >= 0 else ''}{diff:.2f})"
+
+    base_endpoints = (baseline or {}).get("rest", {}).get("endpoints", {})
+    lines = [
+        f"Target: {report['target']}  version: {report['version']}  elapsed: {report['elapsed_s']}s",
+        "",
+        f"{'operation':<36} {'count':>8} {'rps':>9} {'p50 ms':>10} {'p95 ms':>18} {'p99 ms':>18} {'err':>5}",
+    ]
+    rows = list(report["rest"]["endpoints"].items()) + [("TOTAL", report["rest"]["total"])]
+    for name, stats in rows:
+        prev = base_endpoints.get(name) if name != "TOTAL" else (baseline or {}).get("rest", {}).get("total")
+        lines.append(
+            f"{name:<36} {stats['count']:>8} {stats['throughput_per_s']:>9} {stats['p50_ms']:>10}"
+            f" {str(stats['p95_ms']) + delta(stats['p95_ms'], prev and prev.get('p95_ms')):>18}"
+            f" {str(stats['p99_ms']) + delta(stats['p99_ms'], prev and prev.get('p99_ms')):>18}"
+            f" {stats.get('errors', report['rest']['errors']):>5}"
+        )
+
+    ws = report["websocket"]
+    prev_ws = (baseline or {}).get("websocket", {})
+    lines += [
+        "",
+        f"WebSocket: {ws['connected']}/{ws['subscribers']} connected, {ws['failures']} failures, "
+        f"{ws['messages']} messages ({ws['messages_per_s']}/s)",
+        f"Message lag ms: p50 {ws['lag_p50_ms']}{delta(ws['lag_p50_ms'], prev_ws.get('lag_p50_ms'))}"
+        f"  p95 {ws['lag_p95_ms']}{delta(ws['lag_p95_ms'], prev_ws.get('lag_p95_ms'))}"
+        f"  p99 {ws['lag_p99_ms']}{delta(ws['lag_p99_ms'], prev_ws.get('lag_p99_ms'))}",
+    ]
+    return "\n".join(lines)
+
+def parse_mix(value: str) -> Dict[str, int]:
+    """Parse '/api/status=5,/api/metrics/=3' into a weight map"""
+    mix = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        path, _, weight = item.partition("=")
+        mix[path.strip()] = int(weight or 1)
+    if not mix:
+        raise argparse.ArgumentTypeError("REST mix must contain at least one path")
+    return mix
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="GPON simulator load generator")
+    parser.add_argument("--url", help="Base URL of a running server (default: in-process main:app)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Test duration in seconds")
+    parser.add_argument("--rest-clients", type=int, default=20, help="Concurrent REST pollers")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between polls, 0 = closed loop")
+    parser.add_argument("--mix", type=parse_mix, default=None, help="Weighted REST paths, e.g. /api/status=5,/api/metrics/=3")
+    parser.add_argument("--scenario-rate", type=float, default=0.0, help="Scenario starts per second")
+    parser.add_argument("--ws-clients", type=int, default=10, help="Concurrent WebSocket subscribers")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-dir", default="loadtest_results", help="Where to save the JSON report")
+    parser.add_argument("--compare", help="Previous JSON report to compare against")
+    parser.add_argument("--no-save", action="store_true", help="Do not save the report")
+    args = parser.parse_args(argv)
+
+    profile = LoadProfile(
+        url=args.url,
+        duration_s=args.duration,
+        rest_clients=args.rest_clients,
+        poll_interval_s=args.poll_interval,
+        rest_mix=args.mix or dict(DEFAULT_MIX),
+        scenario_rate=args.scenario_rate,
+        ws_clients=args.ws_clients,
+        seed=args.seed,
+    )
+    report = asyncio.run(LoadRunner(profile).run())
+
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    print(format_report(report, baseline))
+    if not args.no_save:
+        print(f"\nSaved report to {save_report(report, args.output_dir)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+On-demand profiling for the running simulator
+Sampling CPU profiler producing collapsed stacks (flamegraph.pl / speedscope
+input), tracemalloc snapshots with diffs, and live object counts.
+Nothing here runs or hooks the interpreter until explicitly started.
+"""
+from typing import Dict, List, Optional
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+
+class SamplingProfiler:
+    """Samples Python stacks of all threads from a background thread"""
+
+    def __init__(self, output_dir: str = "profiles"):
+        self.output_dir = Path(output_dir)
+        self.profile_id: Optional[str] = None
+        self.started_at: Optional[datetime] = None
+        self.duration_s = 0.0
+        self.interval_s = 0.005
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self.last_output: Optional[Path] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration_s: float, interval_s: float = 0.005) -> str:
+        """Start sampling for duration_s seconds"""
+        with self._lock:
+            if self.running:
+                raise RuntimeError("Profiler already running")
+            self.profile_id = f"cpu-{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:4]}"
+            self.started_at = datetime.now()
+            self.duration_s = duration_s
+            self.interval_s = interval_s
+            self.samples = 0
+            self.stacks = Counter()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+            return self.profile_id
+
+    def stop(self) -> Optional[Path]:
+        """Stop sampling early and write the output file"""
+        thread = self._thread
+        if thread is None:
+            return self.last_output
+        self._stop.set()
+        thread.join()
+        return self.last_output
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        deadline = time.perf_counter() + self.duration_s
+        while not self._stop.is_set() and time.perf_counter() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if thread_id not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                self.stacks[self._collapse(names.get(thread_id, str(thread_id)), frame)] += 1
+            self.samples += 1
+            self._stop.wait(self.interval_s)
+        self._write()
+        self._thread = None
+
+    @staticmethod
+    def _collapse(thread_name: str, frame) -> str:
+        parts = []
+        while frame is not None:
+            code = frame.f_code
+            parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        parts.append(thread_name)
+        return ";".join(reversed(parts))
+
+    def _write(self):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        path = self.output_dir / f"{self.profile_id}.collapsed"
+        lines = [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+        path.write_text("\n".join(lines) + "\n")
+        self.last_output = path
+
+    def status(self) -> Dict:
+        return {
+            "running": self.running,
+            "profile_id": self.profile_id,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "duration_s": self.duration_s,
+            "interval_ms": self.interval_s * 1000,
+            "samples": self.samples,
+            "output": str(self.last_output) if self.last_output else None,
+        }
+
+    def output_path(self, profile_id: str) -> Optional[Path]:
+        """Path of a finished profile, None if unknown"""
+        path = self.output_dir / f"{Path(profile_id).name}.collapsed"
+        return path if path.exists() else None
+
+class MemoryProfiler:
+    """tracemalloc snapshots kept in memory and diffed on demand
+
+    snapshot() and diff() walk every traced allocation; callers on the
+    event loop should run them in an executor. A lock keeps concurrent
+    calls from different threads consistent.
+    """
+
+    def __init__(self, max_snapshots: int = 10, frames: int = 10):
+        self.max_snapshots = max_snapshots
+        self.frames = frames
+        self.snapshots: Dict[str, tracemalloc.Snapshot] = {}
+        self.taken_at: Dict[str, datetime] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def snapshot(self) -> Dict:
+        """Take a snapshot, starting tracemalloc on first use
+
+        Allocations made before tracing started are not attributed, so
+        the first snapshot mostly serves as a baseline for later diffs.
+        """
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            ))
+            snapshot_id = f"mem-{len(self.taken_at) + 1}-{uuid.uuid4().hex[:4]}"
+            taken_at = datetime.now()
+            self.snapshots[snapshot_id] = snapshot
+            self.taken_at[snapshot_id] = taken_at
+            while len(self.snapshots) > self.max_snapshots:
+                oldest = next(iter(self.snapshots))
+                del self.snapshots[oldest]
+                del self.taken_at[oldest]
+            current, peak = tracemalloc.get_traced_memory()
+        return {
+            "snapshot_id": snapshot_id,
+            "taken_at": taken_at.isoformat(),
+            "traced_bytes": current,
+            "peak_bytes": peak,
+        }
+
+    def diff(self, first_id: str, second_id: str, limit: int = 20,
+             key_type: str = "lineno") -> Optional[List[Dict]]:
+        """Top allocation differences between two snapshots"""
+        first = self.snapshots.get(first_id)
+        second = self.snapshots.get(second_id)
+        if first is None or second is None:
+            return None
+        stats = second.compare_to(first, key_type)
+        return [
+            {
+                "location": str(stat.traceback[0]) if stat.traceback else "?",
+                "size_diff_bytes": stat.size_diff,
+                "size_bytes": stat.size,
+                "count_diff": stat.count_diff,
+                "count": stat.count,
+            }
+            for stat in stats[:limit]
+        ]
+
+    def list(self) -> List[Dict]:
+        with self._lock:
+            return [
+                {"snapshot_id": snapshot_id, "taken_at": taken.isoformat()}
+                for snapshot_id, taken in self.taken_at.items()
+            ]
+
+    def stop(self):
+        """Stop tracing and drop snapshots, restoring zero overhead"""
+        with self._lock:
+            self.snapshots.clear()
+            self.taken_at.clear()
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+
+def count_objects(base_classes: List[type]) -> Dict[str, int]:
+    """Count live instances per concrete class of the given base classes
+
+    Walks every object the collector tracks; run it in an executor from
+    async code.
+    """
+    counts: Counter = Counter()
+    bases = tuple(base_classes)
+    for obj in gc.get_objects():
+        if isinstance(obj, bases):
+            counts[type(obj).__name__] += 1
+    return dict(counts.most_common())